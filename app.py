@@ -234,7 +234,7 @@ def process_data(ids, selected_client, selected_client_id, selected_port, config
             start_time = time.time()
 
             dar_df = dar_raw.copy()
-            dar_df = remove_data(dar_raw, status_code_col='STATUS CODE', remark_col='NOTES')
+            dar_df = remove_data(dar_raw, status_code_col='STATUS CODE', remark_col='NOTES', client=selected_client, config_path=config_path)
             dar_df.loc[:, 'NOTES'] = dar_df['NOTES'].str.replace('\n', ' ', regex=False)
 
             date_columns = ["birthday", "endorsement_date", "cutoff_date"]
@@ -1,38 +1,143 @@
+import os
+import sys
+import argparse
+import multiprocessing
+import pandas as pd
+from time import time
+from concurrent.futures import ProcessPoolExecutor
 from tabs.bcp_env1 import BCPAutomationE1
 from tabs.bcp_env2 import BCPAutomationE2
 from tabs.bcp_env3 import BCPAutomationE3
+from tabs.bcp_pipeline import FETCH_MODES
+from utils.db import set_upload_slots
+from utils.checkpoint import RUNS_DIR, RUNS_RETENTION_DAYS, new_run_id, run_envs, prune_runs
+from utils.metrics import query_report
 
-def main():
+ENVIRONMENTS = {
+    "ENV1": BCPAutomationE1,
+    "ENV2": BCPAutomationE2,
+    "ENV3": BCPAutomationE3,
+}
+LOG_DIR = "/home/ubuntu/bcp/logs"
+
+def run_env(env, options=None):
+    """Run one environment end to end and return its summary row; `options` go to the pipeline constructor."""
+    automation = ENVIRONMENTS[env]
+    name = automation.__name__
+    start_time = time()
+    summary = {"env": env, "status": "ok", "clients": 0, "uploaded": 0, "failed": 0, "rows": 0}
     try:
-        print("Starting BCPAutomationE1...")
-        bcpe1 = BCPAutomationE1()
-        bcpe1.display()
-        print("BCPAutomationE1 completed.")
+        print(f"Starting {name}...")
+        summary.update(automation(**(options or {})).display() or {})
+        print(f"{name} completed.")
         print(f"========================================================================================")
         print(f"========================================================================================")
     except Exception as e:
-        print(f"BCPAutomationE1 failed: {e}")
-
-    # try:
-    #     print("Starting BCPAutomationE2...")
-    #     bcpe2 = BCPAutomationE2()
-    #     bcpe2.display()
-    #     print("BCPAutomationE2 completed.")
-    #     print(f"========================================================================================")
-    #     print(f"========================================================================================")
-    # except Exception as e:
-    #     print(f"BCPAutomationE2 failed: {e}")
-
-
-    # try:
-    #     print("Starting BCPAutomationE3...")
-    #     bcpe3 = BCPAutomationE3()
-    #     bcpe3.display()
-    #     print("BCPAutomationE3 completed.")
-    #     print(f"========================================================================================")
-    #     print(f"========================================================================================")
-    # except Exception as e:
-    #     print(f"BCPAutomationE3 failed: {e}")
+        print(f"{name} failed: {e}")
+        summary["status"] = f"failed: {e}"
+    summary["seconds"] = round(time() - start_time, 2)
+    return summary
+
+def _init_worker(upload_slots):
+    set_upload_slots(upload_slots)
+
+def _run_env_logged(env, log_dir, options=None):
+    """Process entry point: run `env` with stdout/stderr appended to its own log file."""
+    log_path = os.path.join(log_dir, f"bcp_{env.lower()}.log")
+    with open(log_path, "a", buffering=1, encoding="utf-8") as log:
+        sys.stdout = sys.stderr = log
+        try:
+            summary = run_env(env, options)
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    summary["log"] = log_path
+    return summary
+
+def run_concurrently(envs, log_dir, max_uploads, options=None):
+    """Run each environment in its own process; at most `max_uploads` FTP uploads are in flight across all of them."""
+    os.makedirs(log_dir, exist_ok=True)
+    upload_slots = multiprocessing.BoundedSemaphore(max_uploads)
+    print(f"Running {', '.join(envs)} concurrently (logs in {log_dir}, max {max_uploads} concurrent uploads)")
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=len(envs), initializer=_init_worker, initargs=(upload_slots,)) as executor:
+        futures = {env: executor.submit(_run_env_logged, env, log_dir, options) for env in envs}
+        for env, future in futures.items():
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                summaries.append({"env": env, "status": f"failed: {e}"})
+    return summaries
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and upload the BCP leads for CMS environments.")
+    parser.add_argument("--env", nargs="+", choices=list(ENVIRONMENTS), type=str.upper,
+                        help="Environments to run (default ENV1, or those of the resumed run); "
+                             "more than one runs them concurrently in separate processes")
+    parser.add_argument("--log-dir", default=LOG_DIR, help="Directory for the per-environment logs")
+    parser.add_argument("--max-uploads", type=int, default=int(os.getenv("FTP_MAX_UPLOADS", 3)),
+                        help="Global cap on concurrent FTP uploads across environments")
+    parser.add_argument("--incremental", choices=["delta", "merged"],
+                        help="Extract only debtors changed since each client's watermark and upload the delta or the merged full file")
+    parser.add_argument("--fetch-mode", choices=FETCH_MODES, default="chunked",
+                        help="chunked: IN lists per ID chunk; temp_table: one query per table joined to a temporary ID table; "
+                             "snapshot: one query per table resolving the active debtors on the server")
+    parser.add_argument("--stream-batch-size", type=int, metavar="ROWS",
+                        help="Read query results through a server-side cursor in batches of ROWS rows")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk query result cache")
+    parser.add_argument("--arrow", action="store_true",
+                        help="Keep fetched and transformed frames in Arrow-backed columns (lower memory; ignored for --incremental)")
+    parser.add_argument("--no-categories", action="store_true",
+                        help="Read the low-cardinality DAR/info columns as plain strings instead of categoricals")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help=f"Checkpoint every stage under {RUNS_DIR} so a failed run can be resumed "
+                             f"(runs idle for {RUNS_RETENTION_DAYS} days are deleted)")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help=f"Resume an earlier run from its stage checkpoints in {RUNS_DIR}/RUN_ID")
+    parser.add_argument("--query-report", nargs="?", const=7, type=int, metavar="DAYS",
+                        help="Print p50/p95 query latency per query and client over the last DAYS days (default 7) and exit")
+    args = parser.parse_args()
+    if args.query_report is not None:
+        report = query_report(args.query_report, args.env[0] if args.env and len(args.env) == 1 else None)
+        print(report.to_string(index=False) if not report.empty else "No query metrics recorded yet.")
+        return
+    if (args.resume or args.checkpoint) and args.incremental:
+        parser.error("--checkpoint/--resume cannot be combined with --incremental")
+    options = {"incremental": args.incremental} if args.incremental else {}
+    options["fetch_mode"] = args.fetch_mode
+    if args.stream_batch_size:
+        options["stream_batch_size"] = args.stream_batch_size
+    if args.no_cache:
+        options["use_cache"] = False
+    if args.arrow:
+        options["dtype_backend"] = "pyarrow"
+    if args.no_categories:
+        options["categories"] = False
+
+    if args.resume:
+        try:
+            envs = args.env or run_envs(args.resume)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        options.update(run_id=args.resume, resume=True)
+    else:
+        envs = args.env or ["ENV1"]
+        if args.checkpoint:
+            options["run_id"] = new_run_id()
+    envs = list(dict.fromkeys(envs))
+    if "run_id" in options:
+        pruned = prune_runs(keep=options["run_id"])
+        if pruned:
+            print(f"Pruned checkpoints of run(s) {', '.join(pruned)}")
+        print(f"Run ID: {options['run_id']} (resume with --resume {options['run_id']})")
+    start_time = time()
+    if len(envs) == 1:
+        summaries = [run_env(envs[0], options)]
+    else:
+        summaries = run_concurrently(envs, args.log_dir, max(1, args.max_uploads), options)
+
+    print(f"\n📋 BCP run summary (wall time {time() - start_time:.2f} seconds)")
+    print(pd.DataFrame(summaries).fillna("").to_string(index=False))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
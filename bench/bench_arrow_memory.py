@@ -0,0 +1,180 @@
+"""Memory and time of the default (object) and pyarrow dtype backends on synthetic extracts.
+
+Run from the repository root: python bench/bench_arrow_memory.py [debtors]
+Each case runs transform + build_archive in its own process on the same frames, read the way
+read_sql returns them for that backend, and reports the frame sizes, peak RSS and stage times.
+The AUTOSTAT cases cover the raw DATE columns of fetch_stat.sql (PTP DATE, CLAIM PAID DATE):
+datetime.date objects in object mode, date32 or ISO strings with dtype_backend="pyarrow".
+Every case must produce the same archive as object mode.
+"""
+import os
+import io
+import sys
+import json
+import hashlib
+import tempfile
+import subprocess
+import zipfile
+from time import perf_counter
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# case: (profile, dtype_backend, how the DATE columns arrive in Arrow mode)
+CASES = {
+    "leads object": ("leads", None, None),
+    "leads pyarrow": ("leads", "pyarrow", "date32"),
+    "stat object": ("autostat", None, None),
+    "stat pyarrow date32": ("autostat", "pyarrow", "date32"),
+    "stat pyarrow string": ("autostat", "pyarrow", "string"),
+}
+FRAMES = {"leads": ("info", "address", "contact", "dar"), "autostat": ("stat",)}
+DATE_COLUMNS = {"info": ["endorsement_date", "cutoff_date", "birthday"], "stat": ["PTP DATE", "CLAIM PAID DATE"]}
+
+
+def days(rng, n, missing=0.0):
+    values = [date(2024, 1, 1) + timedelta(days=int(d)) for d in rng.integers(0, 400, n)]
+    return pd.Series(values, dtype=object).where(rng.random(n) >= missing, None)
+
+
+def write_inputs(directory, debtors):
+    """Synthetic fetch results, shaped like the fetch_*.sql columns, as Parquet files."""
+    rng = np.random.default_rng(0)
+    ids = np.arange(debtors)
+    info = pd.DataFrame({
+        "ch_code": ids, "name": [f"NAME {i}" for i in ids], "ch_name": "CLIENT",
+        "account_number": [str(10**9 + i) for i in ids], "outstanding_balance": rng.integers(0, 10**6, debtors).astype(float),
+        "principal": rng.integers(0, 10**6, debtors).astype(float), "endorsement_date": days(rng, debtors),
+        "cutoff_date": days(rng, debtors, 0.5), "birthday": days(rng, debtors, 0.2), "interest": "0",
+        "collector": [f"agent{i % 50}" for i in ids], "card_no": None, "placement": "P1", "cycle": "C1",
+        "product_type": rng.choice(["CARD", "LOAN"], debtors), "credit_limit": "50000", "email": None,
+    })
+    contact = pd.DataFrame({"ch_code": rng.choice(ids, 2 * debtors),
+                            "number": [f"09{x}" for x in rng.integers(10**8, 10**9, 2 * debtors)]}).drop_duplicates()
+    address = pd.DataFrame({"ch_code": rng.choice(ids, 2 * debtors),
+                            "address": [f"{i} Some Street, Barangay {i % 900}, City" for i in range(2 * debtors)]})
+    efforts = 6 * debtors
+    dar = pd.DataFrame({
+        "ch_code": rng.choice(ids, efforts),
+        "RESULT DATE": [datetime(2024, 1, 1) + timedelta(seconds=int(s)) for s in rng.integers(0, 10**7, efforts)],
+        "AGENT": [f"agent{i % 50}" for i in range(efforts)], "DISPOSITION": rng.choice(["PTP", "RPC", "NEGATIVE"], efforts),
+        "SUB DISPOSITION": "S", "AMOUNT": 1.5, "PTP AMOUNT": 2.0, "PTP DATE": "05/06/2024",
+        "CLAIM PAID AMOUNT": None, "CLAIM PAID DATE": None,
+        "NOTES": [f"called debtor, promised to pay on the {i % 28 + 1}th" for i in range(efforts)],
+        "NUMBER CONTACTED": "09171234567", "BARCODED BY": "agent1", "CONTACT SOURCE": "CMS",
+        "STATUS CODE": rng.choice(["PTP", "RPC", "ABORT"], efforts),
+    })
+    stat = pd.DataFrame({
+        "DEBTOR ID": rng.choice(ids, 5 * debtors),
+        "ACCOUNT NUMBER": [f"ACC{i:08d}" for i in rng.choice(ids, 5 * debtors)],
+        "NAME": rng.choice(["ANA CRUZ", "JOSE RIZAL", "MARIA CLARA"], 5 * debtors),
+        "STATUS CODE": rng.choice(["PTP", "RPC", "ABORT", "NA", "KEPT", "CALLBACK"], 5 * debtors),
+        "REMARKS": rng.choice(["called\nno answer", "NA", "Broken Promise", "paid", None], 5 * debtors),
+        "REMARKS BY": [f"agent{i % 50}" for i in range(5 * debtors)],
+        "PHONE": rng.choice(["09171234567", None], 5 * debtors),
+        "BARCODE DATE": [datetime(2024, 1, 1) + timedelta(seconds=int(s)) for s in rng.integers(0, 10**7, 5 * debtors)],
+        "CLAIM PAID AMOUNT": rng.choice([1500.0, np.nan], 5 * debtors),
+        "CLAIM PAID DATE": days(rng, 5 * debtors, 0.7),
+        "PTP AMOUNT": rng.choice([2000.0, 550.5, np.nan], 5 * debtors),
+        "PTP DATE": days(rng, 5 * debtors, 0.4),
+    })
+    for name, df in {"info": info, "contact": contact, "address": address, "dar": dar, "stat": stat}.items():
+        df.to_parquet(os.path.join(directory, f"{name}.parquet"), index=False)
+
+
+def read_input(directory, name, dtype_backend, dates_as):
+    """The frame as read_sql returns it: one str object per cell and datetime.date DATE values by
+    default, Arrow columns with dtype_backend="pyarrow"."""
+    path = os.path.join(directory, f"{name}.parquet")
+    if dtype_backend is None:
+        return pq.read_table(path).to_pandas(deduplicate_objects=False)
+    df = pd.read_parquet(path, dtype_backend="pyarrow")
+    if dates_as == "string":
+        for col in DATE_COLUMNS.get(name, []):
+            df[col] = df[col].astype(pd.ArrowDtype(pa.string()))
+    return df
+
+
+def archive_digest(archive):
+    """Digest of the archive members, each XLSX reduced to its sheet XML (the package metadata carries timestamps)."""
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(archive) as zipped:
+        for name in sorted(zipped.namelist()):
+            data = zipped.read(name)
+            if name.endswith(".xlsx"):
+                data = zipfile.ZipFile(io.BytesIO(data)).read("xl/worksheets/sheet1.xml")
+            digest.update(name.encode("utf-8") + b"\0" + data)
+    return digest.hexdigest()
+
+
+def memory_mib(field):
+    # VmHWM is per process; ru_maxrss would carry over the parent's peak through fork
+    with open("/proc/self/status") as status:
+        return next(int(line.split()[1]) for line in status if line.startswith(f"{field}:")) / 1024
+
+
+def run_case(directory, case):
+    from tabs.bcp_pipeline import BCPPipeline
+    from utils.export import build_archive
+    import utils.queries
+
+    utils.queries._registry = utils.queries.QueryRegistry(os.path.join(ROOT, "query"))
+    profile, dtype_backend, dates_as = CASES[case]
+    pipeline = BCPPipeline(profile=profile, dtype_backend=dtype_backend)
+    pipeline.config_path = os.path.join(ROOT, "config", "config.xlsx")
+
+    frames = {name: read_input(directory, name, dtype_backend, dates_as) for name in FRAMES[profile]}
+    fetched = sum(int(df.memory_usage(deep=True).sum()) for df in frames.values())
+    after_read = memory_mib("VmRSS")
+
+    start = perf_counter()
+    out = pipeline.transform_leads(frames) if profile == "leads" else pipeline.transform_stat({"dar": frames["stat"]})
+    transform = perf_counter() - start
+    start = perf_counter()
+    archive = build_archive(out, profile, 100_000)
+    export = perf_counter() - start
+
+    peak = memory_mib("VmHWM")
+    dated = int((out["PTP DATE"] != "").sum()) if "PTP DATE" in out.columns else None
+    return {"fetched": fetched / 2**20, "output": int(out.memory_usage(deep=True).sum()) / 2**20,
+            "peak": peak, "over_inputs": peak - after_read, "transform": transform, "export": export,
+            "dated": dated, "digest": archive_digest(archive)}
+
+
+def main(debtors):
+    with tempfile.TemporaryDirectory() as directory:
+        write_inputs(directory, debtors)
+        results = {}
+        for case in CASES:
+            proc = subprocess.run([sys.executable, __file__, "--case", case, directory],
+                                  capture_output=True, text=True, check=True)
+            results[case] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{debtors:,} debtors")
+    print(f"{'case':<22}{'fetched':>10}{'output':>10}{'peak RSS':>10}{'+inputs':>10}{'transform':>11}{'export':>9}  archive")
+    failed = False
+    for case, result in results.items():
+        baseline = results[f"{CASES[case][0].replace('autostat', 'stat')} object"]
+        same = result["digest"] == baseline["digest"]
+        failed |= not same
+        dated = f", {result['dated']:,} PTP dates" if result["dated"] is not None else ""
+        print(f"{case:<22}{result['fetched']:>7.0f}MiB{result['output']:>7.0f}MiB{result['peak']:>7.0f}MiB"
+              f"{result['over_inputs']:>7.0f}MiB{result['transform']:>10.2f}s{result['export']:>8.2f}s  "
+              f"{'same as object mode' if same else 'DIFFERS from object mode'}{dated}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--case"]:
+        # Status lines go to stderr, the result is the last stdout line
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        result = run_case(sys.argv[3], sys.argv[2])
+        print(json.dumps(result), file=stdout)
+    else:
+        sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
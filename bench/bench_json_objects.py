@@ -0,0 +1,68 @@
+"""json_objects against the per-row json.dumps path it replaced.
+
+Run from the repository root: python bench/bench_json_objects.py [rows]
+Checks the output is byte-identical for object, categorical and pyarrow frames, then times both paths.
+"""
+import os
+import sys
+import json
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from utils.function import json_objects
+
+FIELDS = {"Name": "name", "Balance": "balance", "Count": "count", "Endorsed": "endorsed",
+          "Status": "status", "Notes": "notes"}
+
+
+def sample(n):
+    rng = np.random.default_rng(0)
+    notes = ["", 'said "call later"', "back\\slash", "tab\there", "line\nbreak", "\x01ctrl", "Ñoño café", None]
+    return pd.DataFrame({
+        "name": [f"name {i}" if i % 7 else None for i in range(n)],
+        "balance": np.where(rng.random(n) < 0.1, np.nan, rng.random(n) * 10**6),
+        "count": rng.integers(0, 10**9, n),
+        "endorsed": pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 10**8, n), unit="s"),
+        "status": rng.choice(["PTP", "RPC", "NEGATIVE"], n),
+        "notes": [notes[i % len(notes)] for i in range(n)],
+    })
+
+
+def json_dumps_rows(df, fields):
+    return df.apply(lambda row: json.dumps({key: "" if pd.isna(row[col]) else str(row[col]) for key, col in fields.items()}), axis=1)
+
+
+def timed(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - start
+
+
+def main(rows):
+    df = sample(rows)
+    expected, base = timed(json_dumps_rows, df, FIELDS)
+    expected = "\n".join(expected).encode("utf-8")
+    print(f"{rows:,} rows, json.dumps per row: {base:.2f}s")
+
+    frames = {
+        "object": df,
+        "categorical": df.astype({"name": "category", "status": "category", "notes": "category"}),
+        "pyarrow": pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype),
+    }
+    failed = False
+    for name, frame in frames.items():
+        for arrow in (False, True):
+            result, elapsed = timed(json_objects, frame, FIELDS, arrow)
+            identical = "\n".join(result).encode("utf-8") == expected
+            failed |= not identical
+            print(f"  {name:<12} arrow={arrow!s:<5} {elapsed:.2f}s ({base / elapsed:.1f}x)  "
+                  f"{'byte-identical' if identical else 'MISMATCH'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
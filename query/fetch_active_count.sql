@@ -0,0 +1,9 @@
+SELECT 
+    debtor.client_id AS "id",
+    COUNT(DISTINCT debtor.id) AS "active"
+FROM debtor
+WHERE debtor.client_id IN ({selected_client_id})
+    AND debtor.is_aborted <> 1
+    AND debtor.is_locked <> 1
+    AND debtor.deleted_at IS NULL
+GROUP BY debtor.client_id
@@ -0,0 +1,30 @@
+SELECT DISTINCT 
+    debtor.id AS "id"
+FROM debtor
+LEFT JOIN `client` ON client.id = debtor.client_id
+WHERE client.id IN ({selected_client_id})
+    AND debtor.is_aborted <> 1
+    AND debtor.is_locked <> 1
+    AND debtor.deleted_at IS NULL
+    AND (
+        debtor.updated_at >= '{since}'
+        OR EXISTS (
+            SELECT 1
+            FROM debtor_followup
+            JOIN followup ON followup.id = debtor_followup.followup_id
+            LEFT JOIN contact_number ON contact_number.id = followup.contact_number_id
+            WHERE debtor_followup.debtor_id = debtor.id
+                AND (followup.datetime >= '{since}'
+                    OR followup.updated_at >= '{since}'
+                    OR debtor_followup.updated_at >= '{since}'
+                    OR contact_number.updated_at >= '{since}')
+        )
+        OR EXISTS (
+            SELECT 1
+            FROM debtor_address
+            JOIN `address` ON address.id = debtor_address.address_id
+            WHERE debtor_address.debtor_id = debtor.id
+                AND (address.updated_at >= '{since}'
+                    OR debtor_address.updated_at >= '{since}')
+        )
+    )
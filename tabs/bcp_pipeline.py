@@ -0,0 +1,1147 @@
+# bcp_pipeline.py
+import io
+import os
+import threading
+import pandas as pd
+import streamlit as st
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta
+from time import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.db import *
+from utils.function import *
+from utils.export import *
+from utils.state import *
+from utils.cache import ResultCache
+from utils.checkpoint import RunCheckpoint
+from utils.metrics import query_labels
+from utils.queries import queries, select_clause
+
+ENV_PORTS = {"ENV1": 3306, "ENV2": 3307, "ENV3": 3308}
+
+# Incremental runs re-check this much time before the stored watermark, for rows committed late
+INCREMENTAL_OVERLAP = timedelta(minutes=10)
+
+# Adaptive chunking: seconds and rows to aim for per chunk, by SQL file; learned sizes persist per (env, query)
+CHUNK_TARGETS = {
+    "fetch_info": {"target_seconds": 20, "row_budget": 20000},
+    "fetch_address": {"target_seconds": 20, "row_budget": 100000},
+    "fetch_contact": {"target_seconds": 20, "row_budget": 100000},
+    "fetch_dar": {"target_seconds": 20, "row_budget": 150000},
+    "fetch_stat": {"target_seconds": 20, "row_budget": 100000},
+}
+
+# Low-cardinality columns stored as categoricals on ingest, by SQL file; info columns use their mapped names
+CATEGORY_COLUMNS = {
+    "fetch_info": ["collector", "cycle", "placement", "product_type"],
+    "fetch_snapshot": ["collector", "cycle", "placement", "product_type"],
+    "fetch_dar": ["AGENT", "DISPOSITION", "SUB DISPOSITION", "CONTACT SOURCE", "BARCODED BY", "STATUS CODE"],
+    "fetch_stat": ["STATUS CODE", "REMARKS BY"],
+}
+
+# How the per-debtor queries get their IDs; see BCPPipeline.__init__
+FETCH_MODES = ("chunked", "temp_table", "snapshot")
+
+# Output profiles: which fetch/transform stages run and which FTP folder the archive lands in
+PROFILES = {
+    "leads": {"fetch": "fetch_leads", "transform": "transform_leads", "folder": "CMS {env}"},
+    "autostat": {"fetch": "fetch_stat", "transform": "transform_stat", "folder": "CMS - AUTOSTAT"},
+}
+
+
+class PrintSink:
+    """Console output for the cron runs (bcp.py)."""
+
+    def write(self, message):
+        print(message)
+
+    success = warning = error = code = write
+
+    def status_line(self):
+        # Progress lines are simply printed one after another
+        return self
+
+    def text(self, message):
+        print(message)
+
+    def table(self, df):
+        print(df.to_string(index=False))
+
+
+class StreamlitSink:
+    """Output for the Streamlit tabs."""
+
+    def write(self, message):
+        st.write(message)
+
+    def success(self, message):
+        st.success(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def error(self, message):
+        st.error(message)
+
+    def code(self, message):
+        st.code(message)
+
+    def status_line(self):
+        # A placeholder that each progress update overwrites
+        return st.empty()
+
+    def table(self, df):
+        st.dataframe(df, hide_index=True)
+
+
+class ClientSink:
+    """A sink that labels every message with the client, so concurrent clients can be told apart in the log."""
+
+    def __init__(self, sink, client):
+        self.sink = sink
+        self.prefix = f"[{client}] "
+
+    def write(self, message):
+        self.sink.write(self.prefix + message)
+
+    def success(self, message):
+        self.sink.success(self.prefix + message)
+
+    def warning(self, message):
+        self.sink.warning(self.prefix + message)
+
+    def error(self, message):
+        self.sink.error(self.prefix + message)
+
+    def code(self, message):
+        self.sink.code(self.prefix + message)
+
+    def status_line(self):
+        return ClientStatusLine(self.sink.status_line(), self.prefix)
+
+    def table(self, df):
+        self.sink.table(df)
+
+
+class ClientStatusLine:
+    def __init__(self, line, prefix):
+        self.line = line
+        self.prefix = prefix
+
+    def text(self, message):
+        self.line.text(self.prefix + message)
+
+
+SINKS = {"print": PrintSink, "streamlit": StreamlitSink}
+
+
+class BCPPipeline:
+    """fetch → transform → export → upload for one CMS environment.
+
+    `profile` picks the fetch/transform stages ("leads" or "autostat") and `sink` where progress
+    goes ("print" or "streamlit"). Any stage can be replaced through `stages` with a callable of the
+    same signature as the method it replaces. `incremental` ("delta" or "merged") makes leads
+    runs extract only debtors changed since the client's last watermark. `run_id` checkpoints every
+    stage under runs/<run_id>/ and `resume` restarts that run from its first incomplete stage; a
+    client's frames are dropped once a server has its archive.
+    `dtype_backend="pyarrow"` keeps the fetched and transformed frames in Arrow-backed columns, and
+    `categories` stores the low-cardinality columns of CATEGORY_COLUMNS as categoricals.
+    """
+
+    def __init__(self, env="ENV1", profile="leads", sink="print", max_workers=4, fetch_mode="chunked",
+                 stream_batch_size=None, client_workers=3, folder=None, stages=None, incremental=None,
+                 use_cache=True, run_id=None, resume=False, adaptive_chunks=True, dtype_backend=None, categories=True):
+        self.config_path = "/home/ubuntu/bcp/config/config.xlsx"
+        # Validate every query/*.sql up front, so a broken template fails before any client starts
+        queries()
+        self.env = env
+        self.port = ENV_PORTS[env]
+        self.profile = profile
+        # Per-thread ClientSink of the client a worker is running (see client_output)
+        self._client_sinks = threading.local()
+        self.sink = SINKS[sink]() if isinstance(sink, str) else sink
+        self.folder = folder or PROFILES[profile]["folder"].format(env=env)
+        # Max chunk queries in flight per fetch; 1 keeps the serial path
+        self.max_workers = max_workers
+        # "chunked" sends IN (...) lists per chunk, "temp_table" joins against a session temporary table,
+        # "snapshot" resolves the active debtors on the server and never ships IDs back to MySQL
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(f"Unknown fetch_mode {fetch_mode!r}; expected one of {', '.join(FETCH_MODES)}")
+        self.fetch_mode = fetch_mode
+        # Rows per batch when reading through a server-side cursor; None buffers each result
+        self.stream_batch_size = stream_batch_size
+        # Clients processed at once by run_environment(); MySQL load is capped separately per environment by query_slot
+        self.client_workers = client_workers
+        # None for full extracts; "delta" uploads only the changed leads, "merged" the refreshed full book
+        self.incremental = incremental if profile == "leads" else None
+        # Size ID chunks from measured latency and rows (CHUNK_TARGETS) instead of the fixed sizes
+        self.adaptive_chunks = adaptive_chunks
+        # Chunk results are cached on disk (utils/cache.py) unless bypassed
+        self.use_cache = use_cache
+        # "pyarrow" reads the fetched frames into Arrow-backed columns and keeps them through the transform;
+        # incremental runs stay on numpy dtypes so their row hashes match the stored snapshots
+        self.dtype_backend = dtype_backend if not self.incremental else None
+        # Read the CATEGORY_COLUMNS of each query as categoricals
+        self.categories = categories
+        # Incremental state per client name, committed once its upload has succeeded
+        self._pending_states = {}
+        # Stage checkpoints for resumable runs; incremental runs keep their own watermark state instead
+        self.checkpoint = RunCheckpoint(run_id, env, resume) if run_id and not self.incremental else None
+
+        self.stages = {
+            "fetch": getattr(self, PROFILES[profile]["fetch"]),
+            "transform": getattr(self, PROFILES[profile]["transform"]),
+            "export": self.export,
+            "upload": self.upload,
+        }
+        if self.incremental:
+            self.stages.update(fetch=self.fetch_leads_delta, transform=self.transform_leads_delta)
+        self.stages.update(stages or {})
+
+    @property
+    def sink(self):
+        """The running client's ClientSink on a client worker thread, else the pipeline's sink."""
+        return getattr(self._client_sinks, "value", None) or self._sink
+
+    @sink.setter
+    def sink(self, sink):
+        self._sink = sink
+
+    @contextmanager
+    def client_output(self, client_name):
+        """Label this thread's output with `client_name` for the block."""
+        previous = getattr(self._client_sinks, "value", None)
+        self._client_sinks.value = ClientSink(self._sink, client_name)
+        try:
+            yield
+        finally:
+            self._client_sinks.value = previous
+
+    def _with_client_output(self, func):
+        """`func` for a worker thread, writing through the calling thread's client label."""
+        sink = getattr(self._client_sinks, "value", None)
+
+        def call(*args):
+            self._client_sinks.value = sink
+            try:
+                return func(*args)
+            finally:
+                self._client_sinks.value = None
+        return call
+
+    # ------------------------------------------------------------------ fetch
+
+    def client_id(_self, selected_env, selected_port):
+        """Fetch the client list for the environment."""
+        try:
+            volare = db_engine('volare', selected_port)
+            start_time = time()
+            sql_query = queries().render("fetch_clients")
+            with query_labels(env=selected_env, sql="fetch_clients"):
+                df = fetch_data(sql_query, volare)
+
+            total_time = time() - start_time
+
+            if df is not None and not df.empty:
+                _self.sink.success(f"All CLIENTS have been fetched for {selected_env} ✅ Total time: {total_time:.2f} seconds.")
+                return df
+            else:
+                _self.sink.write("No clients found.")
+                return None
+
+        except SQLAlchemyError as e:
+            _self.sink.write(f"Database error: {e}")
+            return None
+
+    def active(self, selected_client_id, selected_port):
+        try:
+            volare = db_engine('volare', selected_port)
+            start_time = time()
+            sql_query = queries().render("fetch_active", client_ids=selected_client_id)
+            with query_labels(sql="fetch_active"):
+                df = fetch_data(sql_query, volare)
+
+            total_time = time() - start_time
+            self.sink.write(f"All Active accounts have been fetched  ✅ Total time: {total_time:.2f} seconds.")
+
+            if df is not None and not df.empty:
+                return df
+            else:
+                self.sink.write("No active accounts found.")
+                return None
+
+        except SQLAlchemyError as e:
+            self.sink.write(f"Database error: {e}")
+            return None
+
+    def info(self, ids, selected_client, selected_client_id, selected_port, id_source=None):
+        """Fetch data for the selected client using dynamic column mappings, handling large queries in chunks."""
+        debtor_ids = ids
+
+        if not debtor_ids:
+            self.sink.write("No valid debtor IDs found.")
+            return None
+
+        try:
+            volare = db_engine('volare', selected_port)
+            status_text = self.sink.status_line()
+
+            mappings = load_mappings("Info", self.config_path)
+            if not mappings:
+                self.sink.write(f"No mappings found for {selected_client}.")
+                return None
+
+            columns = select_clause(mappings)
+            start_time = time()
+
+            sql_file = "/home/ubuntu/bcp/query/fetch_info.sql"
+            sql_template = queries()["fetch_info"]
+            cache = self._result_cache(selected_client_id, selected_port, sql_file, debtor_ids, id_source)
+
+            if id_source is not None:
+                # Single pass with the ID set resolved on the server
+                volare, id_query = id_source
+                sql_queries = [sql_template.render(select_clause=columns, id_query=id_query, client_ids=selected_client_id)]
+                status_text.text("Processing 1 chunk(s) with up to 1 concurrent queries...")
+                with query_labels(sql="fetch_info"):
+                    chunks = fetch_chunks(sql_queries, volare, 1,
+                                          lambda idx, total, df_chunk, duration: self._report_chunk(status_text, idx, total, df_chunk, duration),
+                                          chunksize=self.stream_batch_size, cache=cache, dtype_backend=self.dtype_backend,
+                                          categories=self._category_columns("fetch_info"))
+            else:
+                chunks = self._fetch_id_chunks(
+                    debtor_ids,
+                    lambda chunk: sql_template.render(select_clause=columns, client_ids=selected_client_id, ids=chunk),
+                    volare, selected_port, sql_file, 10000, status_text, cache
+                )
+            all_data = [df_chunk for df_chunk in chunks if df_chunk is not None and not df_chunk.empty]
+            del chunks
+
+            total_time = time() - start_time
+            status_text.text(f"Processing INFO completed ✅ Total time: {total_time:.2f} seconds.{self._cache_note(cache)}")
+
+            if all_data:
+                frames = FrameBuilder()
+                frames.consume(all_data)
+                return frames.frame()
+            else:
+                self.sink.warning("No data found for the given debtor IDs.")
+                return None
+
+        except SQLAlchemyError as e:
+            self.sink.write(f"Database error: {e}")
+            return None
+
+    def snapshot(self, selected_client, selected_client_id, id_source):
+        """Fetch the info projection for every active debtor in one streamed pass, without an active() round trip."""
+        try:
+            connection, _ = id_source
+            status_text = self.sink.status_line()
+
+            mappings = load_mappings("Info", self.config_path)
+            if not mappings:
+                self.sink.write(f"No mappings found for {selected_client}.")
+                return None
+
+            start_time = time()
+            sql_query = queries().render("fetch_snapshot", select_clause=select_clause(mappings), client_ids=selected_client_id)
+
+            all_data = FrameBuilder()
+            with query_labels(sql="fetch_snapshot"):
+                for df_batch in fetch_data(sql_query, connection, chunksize=self.stream_batch_size or STREAM_BATCH_SIZE,
+                                           dtype_backend=self.dtype_backend, categories=self._category_columns("fetch_snapshot")):
+                    all_data.add(df_batch)
+                    status_text.text(f"Streamed {all_data.rows} active accounts...")
+
+            total_time = time() - start_time
+            status_text.text(f"Processing SNAPSHOT completed ✅ Total time: {total_time:.2f} seconds.")
+
+            if all_data.rows:
+                return all_data.frame()
+            else:
+                self.sink.warning("No active accounts found.")
+                return None
+
+        except SQLAlchemyError as e:
+            self.sink.write(f"Database error: {e}")
+            return None
+
+    def _open_id_source(self, ids, selected_client_id, selected_port):
+        """Return the (connection, id_query) pair used by single-pass fetch modes, or None for chunked IN lists."""
+        if self.fetch_mode not in ("temp_table", "snapshot"):
+            return None
+
+        connection = db_engine('volare', selected_port).connect()
+        # Incremental runs fetch only the changed debtors, which the active-debtor subquery would widen;
+        # their first run has no delta yet (ids is None) and extracts the whole active book
+        if self.fetch_mode == "snapshot" and (ids is None or not self.incremental):
+            # Reuse the active-debtor predicate as a subquery so IDs stay on the server; its
+            # :client_ids bind takes the same value as the outer query's
+            return connection, queries()["fetch_active"].subquery()
+
+        start_time = time()
+        try:
+            load_id_table(connection, ids)
+        except Exception:
+            connection.close()
+            raise
+        total_time = time() - start_time
+        self.sink.write(f"Loaded {len(ids)} debtor IDs into a temporary table ✅ Total time: {total_time:.2f} seconds.")
+        return connection, ID_TABLE_QUERY
+
+    def _result_cache(self, selected_client_id, selected_port, sql_file, debtor_ids, id_source):
+        """Cache for one fetch, or None when bypassed; single-pass queries are keyed by their ID set too.
+
+        Incremental runs always read the database, since a cached chunk could hide a change.
+        """
+        cache = None
+        # Chunks read with categorical columns are kept apart from the plain ones
+        categories = bool(self._category_columns(self._query_name(sql_file)))
+        if self.use_cache and not self.incremental:
+            cache = ResultCache(self._env_name(selected_port), selected_client_id, sql_file,
+                                ids=debtor_ids if id_source is not None else None, dtype_backend=self.dtype_backend,
+                                categories=categories)
+        if self.checkpoint is not None:
+            # Chunks finished in this run are kept until the client is done, whatever the cache TTL
+            return self.checkpoint.chunk_store(selected_client_id, sql_file, cache, self.dtype_backend, categories)
+        return cache
+
+    def _checkpointed(self, selected_client_id, stage, produce, keep_none=True):
+        """Return the stage output saved in this run's checkpoint, or produce and save it.
+
+        Without a checkpoint this is just produce(). `keep_none=False` leaves a None result unsaved,
+        so stages where None means "stop here" are retried on resume.
+        """
+        if self.checkpoint is None:
+            return produce()
+        found, df = self.checkpoint.load(selected_client_id, stage)
+        if found:
+            self.sink.write(f"⏩ {stage} restored from run {self.checkpoint.run_id}")
+            return df
+        df = produce()
+        if df is not None or keep_none:
+            self.checkpoint.save(selected_client_id, stage, df)
+        return df
+
+    def _restored_frames(self, selected_client_id, stages):
+        """All of `stages` from the checkpoint as a frames dict, or None if any is still missing."""
+        if self.checkpoint is None:
+            return None
+        frames = {}
+        for stage in stages:
+            found, frames[stage] = self.checkpoint.load(selected_client_id, stage)
+            if not found:
+                return None
+        self.sink.write(f"⏩ {', '.join(stages)} restored from run {self.checkpoint.run_id}")
+        return frames
+
+    def _cache_note(self, cache):
+        return f" ({cache.hits} chunk(s) from cache)" if cache is not None and cache.hits else ""
+
+    def _report_chunk(self, status_text, idx, total, df_chunk, duration):
+        rows = 0 if df_chunk is None else len(df_chunk)
+        status_text.text(f"Chunk {idx}/{total} fetched ({rows} rows) in {duration:.2f} seconds")
+
+    def _category_columns(self, query):
+        return CATEGORY_COLUMNS.get(query) if self.categories else None
+
+    def _query_name(self, sql_file):
+        """Query name used for metrics and learned chunk sizes: the SQL file stem."""
+        return os.path.splitext(os.path.basename(sql_file))[0]
+
+    def _fetch_id_chunks(self, debtor_ids, build_query, volare, selected_port, sql_file, chunk_size, status_text, cache):
+        """Fetch `debtor_ids` through `build_query(chunk)`, in chunks sized adaptively or fixed at `chunk_size`.
+
+        Adaptive runs start from the size learned for this (env, query), with `chunk_size` as the
+        first guess, and save what they learned for the next run. With a cache, a fetch of the same
+        IDs first replays the chunk sizes recorded with it, so its chunks keep their cache keys.
+        """
+        report = lambda idx, total, df_chunk, duration: self._report_chunk(status_text, idx, total, df_chunk, duration)
+        env, query = self._env_name(selected_port), self._query_name(sql_file)
+        if not self.adaptive_chunks:
+            sql_queries = [build_query(chunk) for chunk in chunk_list(debtor_ids, chunk_size)]
+            status_text.text(f"Processing {len(sql_queries)} chunk(s) with up to {self.max_workers} concurrent queries...")
+            with query_labels(sql=query):
+                return fetch_chunks(sql_queries, volare, self.max_workers, report, chunksize=self.stream_batch_size, cache=cache,
+                                    dtype_backend=self.dtype_backend, categories=self._category_columns(query))
+
+        sizer = ChunkSizer(load_chunk_size(env, query) or chunk_size, **CHUNK_TARGETS.get(query, {}))
+        status_text.text(f"Processing {len(debtor_ids)} IDs in chunks of {sizer.size} (adaptive) with up to {self.max_workers} concurrent queries...")
+        with query_labels(sql=query):
+            chunks = fetch_adaptive(debtor_ids, build_query, volare, sizer, self.max_workers, report,
+                                    chunksize=self.stream_batch_size, cache=cache, dtype_backend=self.dtype_backend,
+                                    categories=self._category_columns(query),
+                                    plan=cache.plan(debtor_ids) if cache is not None else None)
+        save_chunk_size(env, query, sizer.size)
+        self.sink.write(f"Next {query} chunk size for {env}: {sizer.size}")
+        return chunks
+
+    def _fetch_data_in_chunks(self, debtor_ids, selected_client_id, selected_port,
+                            sql_file, chunk_size, process_name, id_source=None):
+        """Helper method to fetch data in chunks from database."""
+        if not debtor_ids:
+            self.sink.write(f"No debtor IDs provided for {process_name} query. Skipping query.")
+            return None
+
+        try:
+            volare = db_engine('volare', selected_port)
+            status_text = self.sink.status_line()
+            start_time = time()
+            sql_template = queries()[self._query_name(sql_file)]
+            cache = self._result_cache(selected_client_id, selected_port, sql_file, debtor_ids, id_source)
+
+            if id_source is not None:
+                # Single pass with the ID set resolved on the server
+                volare, id_query = id_source
+                sql_queries = [sql_template.render(id_query=id_query, client_ids=selected_client_id)]
+                status_text.text("Processing 1 chunk(s) with up to 1 concurrent queries...")
+                with query_labels(sql=self._query_name(sql_file)):
+                    chunks = fetch_chunks(sql_queries, volare, 1,
+                                          lambda idx, total, df_chunk, duration: self._report_chunk(status_text, idx, total, df_chunk, duration),
+                                          chunksize=self.stream_batch_size, cache=cache, dtype_backend=self.dtype_backend,
+                                          categories=self._category_columns(self._query_name(sql_file)))
+            else:
+                chunks = self._fetch_id_chunks(
+                    debtor_ids,
+                    lambda chunk: sql_template.render(client_ids=selected_client_id, ids=chunk),
+                    volare, selected_port, sql_file, chunk_size, status_text, cache
+                )
+            all_data = [df_chunk for df_chunk in chunks if df_chunk is not None and not df_chunk.empty]
+            del chunks
+
+            total_time = time() - start_time
+            status_text.text(f"Processing {process_name} completed ✅ Total time: {total_time:.2f} seconds.{self._cache_note(cache)}")
+
+            if not all_data:
+                return None
+            frames = FrameBuilder()
+            frames.consume(all_data)
+            return frames.frame()
+
+        except SQLAlchemyError as e:
+            self.sink.warning(f"Database error: {e}")
+            return None
+
+    def contact(self, debtor_ids, selected_client_id, selected_port, id_source=None):
+        """Fetch current month's contact data."""
+        return self._fetch_data_in_chunks(debtor_ids, selected_client_id, selected_port,
+                                        "/home/ubuntu/bcp/query/fetch_contact.sql", 10000, "Contact", id_source)
+
+    def address(self, debtor_ids, selected_client_id, selected_port, id_source=None):
+        """Fetch current month's address data."""
+        return self._fetch_data_in_chunks(debtor_ids, selected_client_id, selected_port,
+                                        "/home/ubuntu/bcp/query/fetch_address.sql", 10000, "Address", id_source)
+
+    def dar(self, debtor_ids, selected_client_id, selected_port, id_source=None):
+        """Fetch the dispositions for the profile: the 10 latest for leads, the 5 latest statuses for AUTOSTAT."""
+        sql_file = "fetch_stat.sql" if self.profile == "autostat" else "fetch_dar.sql"
+        return self._fetch_data_in_chunks(debtor_ids, selected_client_id, selected_port,
+                                        f"/home/ubuntu/bcp/query/{sql_file}", 5000, "DAR", id_source)
+
+    def fetch_leads(self, selected_client, selected_client_id, selected_port):
+        """Fetch stage for leads: info plus the address, contact and DAR frames of the same debtors."""
+        restored = self._restored_frames(selected_client_id, ("info", "address", "contact", "dar"))
+        if restored is not None:
+            return restored
+
+        if self.fetch_mode == "snapshot":
+            id_source = self._open_id_source(None, selected_client_id, selected_port)
+            try:
+                df = self._checkpointed(selected_client_id, "info",
+                                        lambda: self.snapshot(selected_client, selected_client_id, id_source), keep_none=False)
+            except Exception:
+                release_id_source(id_source)
+                raise
+        else:
+            df_active = self._checkpointed(selected_client_id, "active",
+                                           lambda: self.active(selected_client_id, selected_port), keep_none=False)
+            if df_active is None:
+                self.sink.write(f"No active data found for client ID {selected_client_id}. Returning None.")
+                return None
+
+            ids = df_active['id'].dropna().unique().tolist()
+            self.sink.write(f"Debtor IDs: {ids.__len__()}")
+            return self._fetch_lead_frames(ids, selected_client, selected_client_id, selected_port)
+
+        return self._fetch_related_frames(df, selected_client_id, selected_port, id_source)
+
+    def _fetch_lead_frames(self, ids, selected_client, selected_client_id, selected_port):
+        """Fetch info for `ids`, then the address, contact and DAR frames of the same debtors."""
+        id_source = self._open_id_source(ids, selected_client_id, selected_port)
+        try:
+            df = self._checkpointed(selected_client_id, "info",
+                                    lambda: self.info(ids, selected_client, selected_client_id, selected_port, id_source),
+                                    keep_none=False)
+        except Exception:
+            release_id_source(id_source)
+            raise
+        return self._fetch_related_frames(df, selected_client_id, selected_port, id_source)
+
+    def _fetch_related_frames(self, df, selected_client_id, selected_port, id_source):
+        try:
+            if df is None or df.empty:
+                self.sink.write(f"No active data found for client ID {selected_client_id}. Returning None.")
+                return None
+
+            debtor_ids = df['ch_code'].dropna().unique().tolist()
+            # info keeps every active ID, so the same ID source also serves the remaining queries
+            return {
+                "info": df,
+                "address": self._checkpointed(selected_client_id, "address",
+                                              lambda: self.address(debtor_ids, selected_client_id, selected_port, id_source)),
+                "contact": self._checkpointed(selected_client_id, "contact",
+                                              lambda: self.contact(debtor_ids, selected_client_id, selected_port, id_source)),
+                "dar": self._checkpointed(selected_client_id, "dar",
+                                          lambda: self.dar(debtor_ids, selected_client_id, selected_port, id_source)),
+            }
+
+        except Exception as e:
+            self.sink.warning(f"Error fetching data")
+            return None
+        finally:
+            release_id_source(id_source)
+
+    def fetch_stat(self, selected_client, selected_client_id, selected_port):
+        """Fetch stage for AUTOSTAT: the latest dispositions of every active debtor."""
+        restored = self._restored_frames(selected_client_id, ("dar",))
+        if restored is not None:
+            return restored
+
+        df_active = self._checkpointed(selected_client_id, "active",
+                                       lambda: self.active(selected_client_id, selected_port), keep_none=False)
+        if df_active is None:
+            self.sink.write(f"No active data found for client ID {selected_client_id}. Returning None.")
+            return None
+
+        ids = df_active['id'].dropna().unique().tolist()
+        self.sink.code(f"Active Accounts: {ids.__len__()}")
+        id_source = self._open_id_source(ids, selected_client_id, selected_port)
+        try:
+            return {"dar": self._checkpointed(selected_client_id, "dar",
+                                              lambda: self.dar(ids, selected_client_id, selected_port, id_source))}
+        except Exception as e:
+            self.sink.warning(f"Error fetching data")
+            return None
+        finally:
+            release_id_source(id_source)
+
+    def _env_name(self, selected_port):
+        return next((env for env, port in ENV_PORTS.items() if port == int(selected_port)), self.env)
+
+    def _changed_ids(self, selected_client_id, selected_port, since):
+        volare = db_engine('volare', selected_port)
+        sql_query = queries().render("fetch_changed", client_ids=selected_client_id, since=since)
+        with query_labels(sql="fetch_changed"):
+            df = fetch_data(sql_query, volare)
+        return df['id'].dropna().unique().tolist()
+
+    def fetch_leads_delta(self, selected_client, selected_client_id, selected_port):
+        """Incremental fetch stage: only debtors changed since the watermark, or new to the book, are extracted."""
+        env = self._env_name(selected_port)
+        watermark, snapshot = load_state(env, selected_client_id)
+        # Taken from the database clock before reading, so nothing committed during the run is skipped next time
+        run_started = str(fetch_data("SELECT NOW() AS now", db_engine('volare', selected_port))["now"].iloc[0])
+
+        if watermark is None:
+            self.sink.write(f"No incremental state for {selected_client} in {env} yet, running a full extract.")
+            frames = self.fetch_leads(selected_client, selected_client_id, selected_port)
+            active_ids = None
+        else:
+            df_active = self.active(selected_client_id, selected_port)
+            if df_active is None:
+                self.sink.write(f"No active data found for client ID {selected_client_id}. Returning None.")
+                return None
+
+            active_ids = df_active['id'].dropna().unique().tolist()
+            since = (pd.Timestamp(watermark) - INCREMENTAL_OVERLAP).strftime('%Y-%m-%d %H:%M:%S')
+            changed = set(map(str, self._changed_ids(selected_client_id, selected_port, since)))
+            known = set(snapshot["ch_code"].astype(str))
+            ids = [id for id in active_ids if str(id) in changed or str(id) not in known]
+            self.sink.write(f"Incremental: {len(ids)} of {len(active_ids)} active debtors changed since {watermark}")
+            frames = self._fetch_lead_frames(ids, selected_client, selected_client_id, selected_port) if ids else {"info": None}
+
+        if frames is None:
+            return None
+        frames["delta"] = {
+            "client": selected_client, "env": env, "client_id": selected_client_id,
+            "watermark": run_started, "snapshot": snapshot, "active_ids": active_ids,
+        }
+        return frames
+
+    # -------------------------------------------------------------- transform
+
+    def transform_leads(self, frames):
+        """Build the templated leads from the info, address, contact and DAR frames."""
+        df, address_df, contact_df, dar_raw = frames["info"], frames["address"], frames["contact"], frames["dar"]
+
+        status_text = self.sink.status_line()
+        status_text.text("Processing Templated Data...")
+        start_time = time()
+
+        # Filter before ranking so the top-10 work scales with the kept rows
+        dar_df = remove_data(dar_raw, status_code_col='STATUS CODE', remark_col='NOTES', client=frames.get("client"), config_path=self.config_path)
+        dar_df = dar_df.assign(**{"RESULT DATE": as_datetime(dar_df["RESULT DATE"], errors='coerce')})
+        dar_df = top_n_per_key(dar_df, "ch_code", "RESULT DATE", 10)
+        dar_df.loc[:, 'NOTES'] = dar_df['NOTES'].str.replace('\n', ' ', regex=False)
+
+        date_columns = ["birthday", "endorsement_date", "cutoff_date"]
+        df[date_columns] = df[date_columns].apply(lambda x: as_datetime(x, errors='coerce')).apply(lambda x: x.dt.strftime('%m/%d/%Y'))
+
+        df[PHONE_COLUMNS] = ''
+        if contact_df is not None:
+            df[PHONE_COLUMNS] = build_phone_columns(df["ch_code"], contact_df)
+
+        df[ADDRESS_COLUMNS] = ''
+        if address_df is not None:
+            # First five addresses per debtor in fetch order
+            df[ADDRESS_COLUMNS] = spread_by_key(df["ch_code"], address_df, "ch_code", "address", len(ADDRESS_COLUMNS))
+
+        mappings = load_mappings("Info", self.config_path)
+        mapped_columns = [mapped_col for _, mapped_col in mappings]
+
+        fixed_account_fields = {
+            "TAGGED USER": "collector",
+            "OB": "outstanding_balance",
+            "PRINCIPAL": "principal",
+            "CARD_NO": "card_no",
+            "PLACEMENT": "placement",
+            "CYCLE": "cycle",
+            "PRODUCT TYPE": "product_type",
+            "PRIMARY ADDRESS": "address1",
+            "SECONDARY ADDRESS": "address2",
+            "TERTIARY ADDRESS": "address3",
+            "PHONE1": "phone1",
+            "PHONE2": "phone2",
+            "PHONE3": "phone3",
+            "PHONE4": "phone4",
+            "PHONE5": "phone5"
+        }
+
+        account_cols = list(fixed_account_fields.values())
+        additional_exclusions = ["ch_code", "name", "ch_name", "account_number", "outstanding_balance",
+                               "principal", "endorsement_date", "cutoff_date"]
+        excluded_cols = account_cols + additional_exclusions
+
+        arrow = self.dtype_backend == "pyarrow"
+        df["account_information"] = "[" + json_objects(df, fixed_account_fields, arrow) + "]"
+
+        additional_fields = {}
+        for col in mapped_columns:
+            if col not in excluded_cols and col in df.columns:
+                additional_fields[col.upper()] = col
+        df["additional_information"] = "[" + json_objects(df, additional_fields, arrow) + "]"
+
+        dar_columns = {
+            "RESULT DATE": "RESULT DATE",
+            "AGENT": "AGENT",
+            "DISPOSITION": "DISPOSITION",
+            "SUB DISPOSITION": "SUB DISPOSITION",
+            "AMOUNT": "AMOUNT",
+            "PTP AMOUNT": "PTP AMOUNT",
+            "PTP DATE": "PTP DATE",
+            "CLAIM PAID AMOUNT": "CLAIM PAID AMOUNT",
+            "CLAIM PAID DATE": "CLAIM PAID DATE",
+            "NOTES": "NOTES",
+            "NUMBER CONTACTED": "NUMBER CONTACTED",
+            "BARCODED BY": "BARCODED BY",
+            "CONTACT SOURCE": "CONTACT SOURCE"
+        }
+
+        dar_df["RESULT DATE"] = dar_df["RESULT DATE"].dt.strftime('%Y-%m-%d %H:%M:%S')
+        dar_df.loc[:, "PTP DATE"] = pd.to_datetime(dar_df["PTP DATE"], format='%d/%m/%Y', errors='coerce').dt.strftime('%m/%d/%y')
+        dar_df.loc[:, "CLAIM PAID DATE"] = pd.to_datetime(dar_df["CLAIM PAID DATE"], format='%d/%m/%Y', errors='coerce').dt.strftime('%m/%d/%y')
+
+        # Rows are already newest-first per debtor, so the records join in order
+        if arrow:
+            # Grouped by debtor (newest first within each), so the records join without another copy
+            dar_df = dar_df.sort_values("ch_code", kind="stable")
+        dar_df["record"] = json_objects(dar_df, dar_columns, arrow)
+        dar_grouped = join_per_key(dar_df["ch_code"], dar_df["record"], ", ")
+
+        df["history_information"] = wrap_lookup(df["ch_code"], dar_grouped, "[", "]")
+
+        extra_columns = ["ptp_amount", "ptp_date_start", "ptp_date_end", "or_number", "new_contact",
+                       "new_email_address", "source_type", "agent", "new_address", "notes"]
+        for col in extra_columns:
+            df[col] = ""
+        df["field_result_information"] = ""
+
+        columns = ["ch_code", "name", "ch_name", "account_number", "outstanding_balance", "principal",
+                 "endorsement_date", "cutoff_date"] + PHONE_COLUMNS + ADDRESS_COLUMNS + extra_columns + [
+                 "account_information", "additional_information", "field_result_information", "history_information"]
+        df_filtered = fill_blanks(df[columns])
+        if arrow:
+            # Phones, addresses and the reformatted dates are still Python strings
+            df_filtered = arrow_strings(df_filtered)
+
+        total_time = time() - start_time
+        status_text.text(f"Processing Templated Data Completed ✅ Total time: {total_time:.2f} seconds.")
+        return df_filtered
+
+    def transform_stat(self, frames):
+        """Clean and format the AUTOSTAT dispositions."""
+        status_text = self.sink.status_line()
+        status_text.text("Processing Templated Data...")
+        start_time = time()
+
+        dar_raw = remove_data(frames["dar"], status_code_col='STATUS CODE', remark_col='REMARKS', client=frames.get("client"), config_path=self.config_path)
+        self.sink.code(f"Total Cleaned Efforts: {dar_raw.__len__()}")
+        dar_raw['PTP AMOUNT'] = pd.to_numeric(dar_raw['PTP AMOUNT'], errors='coerce').fillna(0).astype(int)
+        dar_raw['CLAIM PAID AMOUNT'] = pd.to_numeric(dar_raw['CLAIM PAID AMOUNT'], errors='coerce').fillna(0).astype(int)
+
+        dar_raw.loc[:, 'REMARKS'] = dar_raw['REMARKS'].str.replace('\n', ' ', regex=False)
+        dar_raw.loc[:, "BARCODE DATE"] = as_datetime(dar_raw["BARCODE DATE"], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+        # fetch_stat.sql selects the raw DATE columns: datetime.date objects, or date32/ISO strings with dtype_backend="pyarrow"
+        dar_raw.loc[:, "PTP DATE"] = as_datetime(dar_raw["PTP DATE"], errors='coerce').dt.strftime('%Y-%m-%d')
+        dar_raw.loc[:, "CLAIM PAID DATE"] = as_datetime(dar_raw["CLAIM PAID DATE"], errors='coerce').dt.strftime('%Y-%m-%d')
+        df_filtered = fill_blanks(dar_raw, [float("inf"), float("-inf"), pd.NA, "NA", None])
+        if self.dtype_backend == "pyarrow":
+            df_filtered = arrow_strings(df_filtered)
+
+        total_time = time() - start_time
+        status_text.text(f"Processing Templated Data Completed ✅ Total time: {total_time:.2f} seconds.")
+        return df_filtered
+
+    def transform_leads_delta(self, frames):
+        """Incremental transform stage: build the changed leads and fold them into the client's snapshot."""
+        state = frames.pop("delta")
+        delta = self.transform_leads(frames) if frames["info"] is not None else None
+
+        if state["snapshot"] is None:
+            merged = changed = with_row_hashes(delta)
+        else:
+            if delta is None:
+                delta = state["snapshot"].drop(columns=HASH_COLUMN).iloc[0:0]
+            merged, changed = merge_delta(state["snapshot"], delta, state["active_ids"])
+            self.sink.write(f"Incremental: {len(changed)} changed lead(s), {len(merged)} in the merged book")
+
+        # Committed by init_ftp once the upload went through
+        first_run = state["snapshot"] is None
+        self._pending_states[state["client"]] = dict(state, snapshot=merged, kind="full" if first_run else self.incremental)
+        output = changed if self.incremental == "delta" else merged
+        if output.empty:
+            # Nothing changed, so there is no upload to wait for; advance the watermark now, or every
+            # later run re-scans the whole window since the last upload
+            self.commit_state(state["client"])
+        return output.drop(columns=HASH_COLUMN).reset_index(drop=True)
+
+    def commit_state(self, selected_client):
+        """Advance the client's watermark and snapshot after a successful upload, or an empty delta."""
+        state = self._pending_states.pop(selected_client, None)
+        if state is not None:
+            save_state(state["env"], state["client_id"], state["watermark"], state["snapshot"])
+            self.sink.write(f"Incremental state saved for {selected_client} (watermark {state['watermark']})")
+
+    def process_data(self, selected_client, selected_client_id, selected_port=None):
+        """Run the fetch and transform stages; returns the final frame or None. A checkpointed transform skips both."""
+        # Every query of this client is recorded under its env and name (utils/metrics.py)
+        with query_labels(env=self._env_name(selected_port or self.port), client=selected_client):
+            return self._checkpointed(selected_client_id, "transform",
+                                      lambda: self._fetch_and_transform(selected_client, selected_client_id, selected_port),
+                                      keep_none=False)
+
+    def _fetch_and_transform(self, selected_client, selected_client_id, selected_port=None):
+        frames = self.stages["fetch"](selected_client, selected_client_id, selected_port or self.port)
+        if frames is None:
+            return None
+        # The transform reads the client's remove_data rules from config.xlsx
+        frames["client"] = selected_client
+        try:
+            return self.stages["transform"](frames)
+        except Exception as e:
+            self.sink.warning(f"Error fetching data")
+            return None
+
+    # ---------------------------------------------------------- export/upload
+
+    def export(self, df_filtered, selected_client, chunk_size):
+        """Export stage: build the upload archive once, addressed by content."""
+        filename_base = f"{selected_client}-{pd.Timestamp.now().strftime('%Y-%m-%d')}"
+        if self._pending_states.get(selected_client, {}).get("kind") == "delta":
+            filename_base += "-delta"
+        total_rows = len(df_filtered)
+        num_chunks = (total_rows + chunk_size - 1) // chunk_size
+        self.sink.write(f"📊 Splitting data into {num_chunks} chunk(s)...")
+        self.sink.write("📦 Compressing files into ZIP...")
+        artifact = build_artifact(df_filtered, filename_base, chunk_size)
+        self.sink.write(f"📦 Built `{artifact['name']}` ({artifact['size']:,} bytes, sha256 {artifact['sha256'][:12]})")
+        return artifact
+
+    def ftp_servers(self):
+        return [
+            {
+                "hostname": os.getenv(f"{site}_FTP_HOSTNAME"),
+                "port": int(os.getenv(f"{site}_FTP_PORT", 21)),
+                "username": os.getenv(f"{site}_FTP_USERNAME"),
+                "password": os.getenv(f"{site}_FTP_PASSWORD")
+            }
+            for site in ("NMKT", "PITX", "PAN")
+        ]
+
+    def upload(self, artifact, selected_client):
+        """Upload stage: fan the same archive out to every configured FTP server; returns one result row per server."""
+        ftp_base_remote_path = "/admin/ACTIVE/backup/LEADS"
+
+        client_key = self._client_key(selected_client)
+        uploaded = self.checkpoint.uploads(client_key) if client_key else {}
+
+        servers, results = [], []
+        for server in self.ftp_servers():
+            if not all([server["hostname"], server["username"], server["password"]]):
+                self.sink.write(f"FTP credentials missing for server {server['hostname'] or 'unknown'}")
+                continue  # Skip this server if credentials are incomplete
+            if server["hostname"] in uploaded:
+                # Already received this archive before the run was resumed
+                results.append({"server": server["hostname"], "status": "uploaded",
+                                "file": uploaded[server["hostname"]]["file"], "seconds": 0.0, "error": ""})
+                continue
+            servers.append(server)
+
+        results += run_in_threads(
+            self._with_client_output(lambda server: self._upload_to_server(server, artifact, ftp_base_remote_path, selected_client)),
+            servers,
+            len(servers)
+        )
+        self._report_uploads(selected_client, artifact, results)
+        return results
+
+    def init_ftp(self, df_filtered, selected_client, chunk_size, status=None):
+        """Export and upload one client's frame; `status` is the Streamlit status box to complete."""
+        try:
+            client_key = self._client_key(selected_client)
+            artifact = self.checkpoint.load_artifact(client_key) if client_key else None
+            if artifact is None:
+                artifact = self.stages["export"](df_filtered, selected_client, chunk_size)
+                if client_key:
+                    self.checkpoint.save_artifact(client_key, artifact, len(df_filtered))
+            else:
+                self.sink.write(f"⏩ export restored from run {self.checkpoint.run_id}: `{artifact['name']}`")
+            results = self.stages["upload"](artifact, selected_client)
+            if any(result["status"] == "uploaded" for result in results):
+                self.commit_state(selected_client)
+            if status is not None:
+                status.update(label="Report creation completed!", state="complete")
+            return results
+
+        except Exception as e:
+            self.sink.write(f"Error in init_ftp: {e}")
+            raise
+
+    def _upload_to_server(self, server, artifact, ftp_base_remote_path, selected_client):
+        """Upload the shared artifact over the pooled session for one server; returns a result row."""
+        start_time = time()
+        result = {"server": server["hostname"], "status": "failed", "file": "", "seconds": 0.0, "error": ""}
+        try:
+            # One login per server, reused across clients for the rest of the run
+            with ftp_session(server["hostname"], server["port"], server["username"], server["password"]) as session:
+                if session is None:
+                    self.sink.write(f"Failed to connect to FTP server {server['hostname']}")
+                    result["error"] = "connection failed"
+                else:
+                    self.sink.write(f"✅ Successfully connected to FTP server at {server['hostname']}:{server['port']}")
+                    zip_filename = self.upload_to_ftp(session, artifact, ftp_base_remote_path, artifact["base"], selected_client)
+                    result.update(status="uploaded", file=zip_filename)
+                    client_key = self._client_key(selected_client)
+                    if client_key:
+                        self.checkpoint.mark_uploaded(client_key, server["hostname"], zip_filename)
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = time() - start_time
+        return result
+
+    def _client_key(self, selected_client):
+        """Checkpoint key of a client, or None when this run is not checkpointed."""
+        return self.checkpoint.client_key(selected_client) if self.checkpoint is not None else None
+
+    def _report_uploads(self, selected_client, artifact, results):
+        """One line per server for the shared artifact."""
+        uploaded = sum(result["status"] == "uploaded" for result in results)
+        self.sink.write(f"📋 {selected_client}: `{artifact['name']}` (sha256 {artifact['sha256'][:12]}) uploaded to {uploaded}/{len(results)} server(s)")
+        self.sink.table(pd.DataFrame(results, columns=["server", "status", "file", "seconds", "error"]))
+
+    def upload_to_ftp(self, session, artifact, base_remote_path, filename_base, selected_client):
+        """Upload the prebuilt ZIP artifact through a pooled FTP session; returns the remote file name."""
+        try:
+            self.sink.write("🔍 Checking directory structure...")
+            current_date = datetime.now()
+            year = current_date.strftime("%Y")
+            month = current_date.strftime("%b")
+            client_folder = selected_client.lower()
+            remote_path = os.path.join(base_remote_path, year, self.folder, month, client_folder).replace("\\", "/")
+
+            # Directories already seen on this session are not walked again
+            for created in session.ensure_dir(remote_path):
+                self.sink.write(f"📁 Created directory: {created}")
+            self.sink.write(f"🔌 Directory `{remote_path}` is ready")
+
+            existing_files = session.ftp.nlst()
+            zip_filename = artifact["name"]
+            counter = 1
+            while zip_filename in existing_files:
+                zip_filename = f"{filename_base}({counter}).zip"
+                counter += 1
+
+            self.sink.write(f"🚀 Uploading `{zip_filename}` to {session.hostname}...")
+            # Each server reads its own stream over the shared bytes; upload_slot applies the runner's global cap
+            with upload_slot():
+                session.ftp.storbinary(f"STOR {zip_filename}", io.BytesIO(artifact["data"]))
+
+            self.sink.write(f"✅ Uploaded `{zip_filename}` to: `{remote_path}` on {session.hostname}")
+            self.sink.write(f"====================================================================================")
+            return zip_filename
+
+        except Exception as e:
+            self.sink.write(f"❌ Failed to upload files to FTP: {str(e)}")
+            raise
+
+    # ----------------------------------------------------------------- runner
+
+    def _order_clients(self, client_dict, selected_port):
+        """Order clients by active-debtor count, largest first; keeps the given order if counting fails."""
+        clients = list(client_dict.items())
+        try:
+            volare = db_engine('volare', selected_port)
+            sql_query = queries().render("fetch_active_count", client_ids=[client_id for _, client_id in clients])
+            with query_labels(env=self._env_name(selected_port), sql="fetch_active_count"):
+                counts = fetch_data(sql_query, volare)
+            active = dict(zip(counts["id"].astype(int), counts["active"].astype(int)))
+        except Exception as e:
+            self.sink.write(f"⚠️ Could not estimate client sizes, keeping the listed order: {e}")
+            return clients
+
+        clients.sort(key=lambda client: active.get(int(client[1]), 0), reverse=True)
+        self.sink.write("Client order: " + ", ".join(f"{name} ({active.get(int(client_id), 0)})" for name, client_id in clients))
+        return clients
+
+    def _run_labelled_client(self, client_name, client_id, selected_port, chunk_size):
+        # Clients run concurrently, so every line they print carries the client name
+        with self.client_output(client_name):
+            return self._run_client(client_name, client_id, selected_port, chunk_size)
+
+    def _run_client(self, client_name, client_id, selected_port, chunk_size):
+        """Process and upload one client; any failure is contained to that client."""
+        outcome = {"rows": 0, "uploaded": 0, "failed": 0}
+        try:
+            if self.checkpoint is not None:
+                self.checkpoint.register(client_name, client_id)
+                if self.checkpoint.is_done(client_id):
+                    self.sink.write(f"⏩ {client_name} already completed in run {self.checkpoint.run_id}, skipping")
+                    return dict(outcome, rows=self.checkpoint.rows(client_id), uploaded=1)
+
+            self.sink.write(f"🔄 Processing client: {client_name} (ID: {client_id})")
+
+            exported = self.checkpoint.exported_rows(client_id) if self.checkpoint is not None else None
+            if exported is not None:
+                # The archive was built before the run stopped; only its remaining uploads are left
+                self.sink.write(f"⏩ {client_name} exported in run {self.checkpoint.run_id}, retrying the remaining uploads")
+                df_filtered, rows = None, exported
+            else:
+                # Always load mappings from the 'Info' sheet
+                mappings = load_mappings("Info", self.config_path)
+                if not mappings:
+                    self.sink.write("⚠️ No mappings found in the 'Info' sheet. Skipping.\n")
+                    return outcome
+
+                df_filtered = self.process_data(client_name, client_id, selected_port)
+
+                if df_filtered is None:
+                    self.sink.write(f"⚠️ No active data found for {client_name}. Skipping to next client.\n")
+                    return outcome
+                if df_filtered.empty:
+                    self.sink.write(f"⚠️ No data returned for {client_name}. Skipping.\n")
+                    return outcome
+                self.sink.write(f"✅ Data fetched for {client_name}. Sending to FTP...")
+                rows = len(df_filtered)
+
+            results = self.init_ftp(df_filtered, client_name, chunk_size)
+            outcome["rows"] = rows
+            outcome["uploaded"] = int(any(result["status"] == "uploaded" for result in results))
+            if self.checkpoint is not None and results:
+                if all(result["status"] == "uploaded" for result in results):
+                    self.checkpoint.finish(client_id, rows)
+                elif outcome["uploaded"]:
+                    # A server has the archive; the frames (debtor data) are not needed to retry the others
+                    self.checkpoint.drop_frames(client_id)
+        except Exception as e:
+            self.sink.write(f"❌ {client_name} failed: {e}\n")
+            outcome["failed"] = 1
+        return outcome
+
+    def run_environment(self, client_df=None, chunk_size=5000):
+        """Run every client of this environment; returns run stats for the bcp.py summary."""
+        selected_env, selected_port = self.env, self.port
+        self.sink.write(f"Selected environment: {selected_env}")
+        self.sink.write(f"Using port: {selected_port}")
+        self.sink.write(f"Chunk size: {chunk_size}\n")
+
+        stats = {"env": selected_env, "clients": 0, "uploaded": 0, "failed": 0, "rows": 0}
+
+        if client_df is None:
+            client_df = self.client_id(selected_env, selected_port)
+
+        if client_df is not None and not client_df.empty:
+            client_dict = dict(zip(client_df['name'], client_df['id']))
+            stats["clients"] = len(client_dict)
+            self.sink.write(f"📋 Found {len(client_dict)} clients. Starting data processing...\n")
+
+            # Largest clients start first so the small ones fill in around them
+            clients = self._order_clients(client_dict, selected_port)
+            with ThreadPoolExecutor(max_workers=max(1, min(self.client_workers, len(clients)))) as executor:
+                futures = [
+                    executor.submit(self._run_labelled_client, client_name, client_id, selected_port, chunk_size)
+                    for client_name, client_id in clients
+                ]
+                for future in as_completed(futures):
+                    outcome = future.result()
+                    stats["rows"] += outcome["rows"]
+                    stats["uploaded"] += outcome["uploaded"]
+                    stats["failed"] += outcome["failed"]
+        else:
+            self.sink.write("❌ No clients available for this environment.")
+
+        return stats
+
+    def display_streamlit(self, header):
+        """Streamlit form shared by the tabs: pick environment and client, then build and upload."""
+        st.header(header)
+
+        chunk_size = st.number_input("Enter Chunk Size:", min_value=1, value=5000, step=100)
+        self.use_cache = not st.checkbox("Refresh from database (ignore cached results)")
+        self.fetch_mode = st.selectbox("Fetch mode", FETCH_MODES, index=FETCH_MODES.index(self.fetch_mode),
+                                       help="chunked: IN lists per chunk; temp_table: one query joined to a temporary ID table; "
+                                            "snapshot: one query that resolves the active debtors on the server")
+        self.stream_batch_size = st.number_input("Stream batch size (rows per batch, 0 reads each query at once)",
+                                                 min_value=0, value=self.stream_batch_size or 0, step=10000) or None
+
+        env_options = list(ENV_PORTS)
+        selected_env = st.selectbox("Select Environment", env_options)
+        selected_port = ENV_PORTS[selected_env]
+
+        selected_client = selected_client_id = None
+        client_df = self.client_id(selected_env, selected_port) if selected_env else None
+
+        if client_df is not None and not client_df.empty:
+            client_dict = dict(zip(client_df['name'], client_df['id']))
+            selected_client = st.selectbox("Select Client", options=client_dict.keys())
+            selected_client_id = client_dict[selected_client]
+        else:
+            st.warning("No clients available.")
+
+        if selected_client and selected_client_id and selected_env:
+            create_btn = st.button("Get Data")
+
+            if create_btn:
+                with st.status("Creating report...", expanded=True) as status:
+                    df_filtered = self.process_data(selected_client, selected_client_id, selected_port)
+
+                    if df_filtered is not None:
+                        st.success("Data processed successfully! Ready to upload.")
+                        st.write("Final Data:")
+                        st.write(df_filtered.head())
+                        self.init_ftp(df_filtered, selected_client, chunk_size, status)
+                    else:
+                        st.error("No data fetched.")
+                        status.update(label="Report creation failed!", state="error")
+        else:
+            st.warning("Please select a client and upload the needed file.")
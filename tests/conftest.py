@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep test queries out of the production metrics database
+os.environ.setdefault("BCP_QUERY_METRICS", "0")
+
+import utils.queries
+
+# The pipeline validates query/*.sql on construction; read them from this checkout
+utils.queries._registry = utils.queries.QueryRegistry(os.path.join(ROOT, "query"))
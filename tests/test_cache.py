@@ -0,0 +1,41 @@
+import os
+from time import time
+import pandas as pd
+import utils.cache
+from utils.cache import ResultCache, evict
+
+
+def test_evict_removes_expired_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    sql_file = tmp_path / "fetch_dar.sql"
+    sql_file.write_text("SELECT 1")
+    cache = ResultCache("ENV1", 7, str(sql_file), ttl=60)
+    df = pd.DataFrame({"ch_code": [1, 2]})
+    cache.put("SELECT 1", df)
+    cache.plan([1, 2]).save([1000])
+    stale = time() - 120
+    for path in (cache.path("SELECT 1"), cache.plan([1, 2]).path):
+        os.utime(path, (time(), stale))
+
+    # Writing another chunk evicts the expired ones, though the cache is far under its size cap
+    cache.put("SELECT 2", df)
+    assert not os.path.exists(cache.path("SELECT 1"))
+    assert not os.path.exists(cache.plan([1, 2]).path)
+    assert cache.get("SELECT 2").equals(df)
+
+    evict(ttl=0)
+    assert not os.path.exists(cache.path("SELECT 2"))
+
+
+def test_categorical_chunks_are_cached_apart(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    from tabs.bcp_pipeline import BCPPipeline
+    query_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "query")
+
+    def entry(sql_file, categories):
+        cache = BCPPipeline(categories=categories)._result_cache(7, 3306, os.path.join(query_dir, sql_file), [1, 2], None)
+        return cache.path("SELECT 1")
+
+    assert entry("fetch_dar.sql", True) != entry("fetch_dar.sql", False)
+    # Queries without categorical columns share their entries
+    assert entry("fetch_address.sql", True) == entry("fetch_address.sql", False)
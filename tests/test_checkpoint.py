@@ -0,0 +1,91 @@
+import os
+from time import time
+import pandas as pd
+import utils.cache
+import utils.checkpoint
+from utils.cache import ResultCache
+from utils.checkpoint import RunCheckpoint, prune_runs
+
+
+def setup_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(utils.checkpoint, "RUNS_DIR", str(tmp_path / "runs"))
+    sql_file = tmp_path / "fetch_dar.sql"
+    sql_file.write_text("SELECT 1")
+    return str(sql_file)
+
+
+def test_chunk_is_stored_once(tmp_path, monkeypatch):
+    sql_file = setup_dirs(tmp_path, monkeypatch)
+    cache = ResultCache("ENV1", 7, sql_file)
+    store = RunCheckpoint("run", "ENV1").chunk_store(7, sql_file, cache)
+    df = pd.DataFrame({"ch_code": [1, 2], "NOTES": ["a", "b"]})
+    store.put("SELECT 1", df)
+
+    stored = os.stat(store._path("SELECT 1") + ".parquet")
+    assert os.path.samefile(store._path("SELECT 1") + ".parquet", cache.path("SELECT 1"))
+    assert stored.st_nlink == 2
+    assert cache.get("SELECT 1").equals(df)
+
+    # A chunk found only in the shared cache is linked into the run, not rewritten
+    cache.put("SELECT 2", df)
+    assert store.get("SELECT 2").equals(df)
+    assert os.path.samefile(store._path("SELECT 2") + ".parquet", cache.path("SELECT 2"))
+
+
+def test_drop_frames_keeps_archive(tmp_path, monkeypatch):
+    sql_file = setup_dirs(tmp_path, monkeypatch)
+    checkpoint = RunCheckpoint("run", "ENV1")
+    checkpoint.save(7, "dar", pd.DataFrame({"ch_code": [1]}))
+    checkpoint.chunk_store(7, sql_file).put("SELECT 1", pd.DataFrame({"ch_code": [1]}))
+    assert checkpoint.exported_rows(7) is None
+    checkpoint.save_artifact(7, {"name": "x.zip", "base": "x", "data": b"zip", "size": 3, "sha256": "0"}, rows=1)
+
+    checkpoint.drop_frames(7)
+    assert os.listdir(os.path.join(checkpoint.directory, "7")) == ["export.zip"]
+    assert checkpoint.load(7, "dar") == (False, None)
+    assert checkpoint.exported_rows(7) == 1
+    assert RunCheckpoint("run", "ENV1", resume=True).load_artifact(7)["data"] == b"zip"
+
+
+def test_prune_runs(tmp_path, monkeypatch):
+    setup_dirs(tmp_path, monkeypatch)
+    for run_id in ("old", "recent", "current"):
+        RunCheckpoint(run_id, "ENV1")
+    stale = time() - 10 * 86400
+    for run_id in ("old", "current"):
+        os.utime(os.path.join(utils.checkpoint.RUNS_DIR, run_id, "env1", "manifest.json"), (stale, stale))
+
+    assert prune_runs(3, keep="current") == ["old"]
+    assert sorted(os.listdir(utils.checkpoint.RUNS_DIR)) == ["current", "recent"]
+
+
+def test_resume_retries_only_the_uploads(tmp_path, monkeypatch):
+    setup_dirs(tmp_path, monkeypatch)
+    import tabs.bcp_pipeline
+    monkeypatch.setattr(tabs.bcp_pipeline, "load_mappings", lambda sheet, path: [("a", "b")])
+    calls = {"fetch": 0, "servers": []}
+
+    def fetch(client, client_id, port):
+        calls["fetch"] += 1
+        return {"dar": pd.DataFrame({"ch_code": [1, 2, 3]})}
+
+    def upload(artifact, client):
+        down = len(calls["servers"]) == 0
+        calls["servers"].append(artifact["data"])
+        return [{"server": "a", "status": "uploaded"}, {"server": "b", "status": "failed" if down else "uploaded"}]
+
+    stages = {
+        "fetch": fetch,
+        "transform": lambda frames: frames["dar"],
+        "export": lambda df, client, chunk_size: {"name": "x.zip", "base": "x", "data": b"zip", "size": 3, "sha256": "0"},
+        "upload": upload,
+    }
+    first = tabs.bcp_pipeline.BCPPipeline(run_id="run", stages=stages)
+    assert first._run_client("ACME", 7, 3306, 100) == {"rows": 3, "uploaded": 1, "failed": 0}
+    assert os.listdir(os.path.join(first.checkpoint.directory, "7")) == ["export.zip"]
+
+    resumed = tabs.bcp_pipeline.BCPPipeline(run_id="run", resume=True, stages=stages)
+    assert resumed._run_client("ACME", 7, 3306, 100) == {"rows": 3, "uploaded": 1, "failed": 0}
+    assert calls["fetch"] == 1 and calls["servers"] == [b"zip", b"zip"]
+    assert resumed.checkpoint.is_done(7)
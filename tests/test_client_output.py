@@ -0,0 +1,53 @@
+import pandas as pd
+import tabs.bcp_pipeline
+from tabs.bcp_pipeline import BCPPipeline
+
+
+class RecordingSink:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, message):
+        self.lines.append(message)
+
+    success = warning = error = code = text = write
+
+    def status_line(self):
+        return self
+
+    def table(self, df):
+        pass
+
+
+def test_concurrent_clients_label_their_output(monkeypatch):
+    monkeypatch.setattr(tabs.bcp_pipeline, "load_mappings", lambda sheet, path: [("a", "b")])
+    sink = RecordingSink()
+
+    def fetch(client, client_id, port):
+        pipeline.sink.status_line().text(f"Processing chunk 1/1 for {client_id}")
+        return {"dar": pd.DataFrame({"ch_code": [client_id]})}
+
+    stages = {
+        "fetch": fetch,
+        "transform": lambda frames: frames["dar"],
+        "export": lambda df, client, chunk_size: {"name": "x.zip", "base": "x", "data": b"zip", "size": 3, "sha256": "0"},
+    }
+    pipeline = BCPPipeline(sink=sink, stages=stages, use_cache=False, client_workers=2)
+    monkeypatch.setattr(pipeline, "_order_clients", lambda clients, port: list(clients.items()))
+    monkeypatch.setattr(pipeline, "ftp_servers", lambda: [{"hostname": h, "port": 21, "username": "u", "password": "p"} for h in ("a", "b")])
+
+    def upload_to_server(server, artifact, path, client):
+        pipeline.sink.write(f"Uploaded to {server['hostname']}")
+        return {"server": server["hostname"], "status": "uploaded", "file": "x.zip", "seconds": 0.0, "error": ""}
+    monkeypatch.setattr(pipeline, "_upload_to_server", upload_to_server)
+
+    stats = pipeline.run_environment(pd.DataFrame({"name": ["ACME", "GLOBEX"], "id": [1, 2]}))
+    assert stats["uploaded"] == 2
+
+    client_lines = sink.lines[sink.lines.index("📋 Found 2 clients. Starting data processing...\n") + 1:]
+    assert client_lines and all(line.startswith(("[ACME] ", "[GLOBEX] ")) for line in client_lines)
+    assert "[GLOBEX] Processing chunk 1/1 for 2" in client_lines
+    assert {"[ACME] Uploaded to a", "[ACME] Uploaded to b", "[GLOBEX] Uploaded to b"} <= set(client_lines)
+    # Output outside a client worker is not labelled
+    pipeline.sink.write("done")
+    assert sink.lines[-1] == "done"
@@ -0,0 +1,50 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+import utils.cache
+from utils.cache import ResultCache
+from utils.function import ChunkSizer, fetch_adaptive
+
+
+def debtor_db(path, rows=3000):
+    engine = create_engine(f"sqlite:///{path}")
+    pd.DataFrame({"id": range(rows), "name": [f"debtor {i}" for i in range(rows)]}).to_sql("debtor", engine, index=False)
+    return engine
+
+
+def build_query(chunk):
+    return text(f"SELECT id, name FROM debtor WHERE id IN ({','.join(map(str, chunk))}) ORDER BY id")
+
+
+def test_replayed_plan_keeps_cache_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    sql_file = tmp_path / "fetch_debtor.sql"
+    sql_file.write_text("SELECT id, name FROM debtor")
+    engine = debtor_db(tmp_path / "volare.db")
+    ids = list(range(3000))
+
+    first = ResultCache("ENV1", 1, str(sql_file))
+    expected = fetch_adaptive(ids, build_query, engine, ChunkSizer(400, min_size=100), 2, cache=first, plan=first.plan(ids))
+
+    # A later run has learned another size; replaying the plan still cuts the cached chunks
+    again = ResultCache("ENV1", 1, str(sql_file))
+    frames = fetch_adaptive(ids, build_query, engine, ChunkSizer(1300, min_size=100), 2, cache=again, plan=again.plan(ids))
+    assert again.hits == len(expected) == len(frames)
+    assert pd.concat(frames).equals(pd.concat(expected))
+
+    unplanned = ResultCache("ENV1", 1, str(sql_file))
+    fetch_adaptive(ids, build_query, engine, ChunkSizer(1300, min_size=100), 2, cache=unplanned)
+    assert unplanned.hits == 0
+
+
+def test_plan_extends_past_recorded_sizes(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    sql_file = tmp_path / "fetch_debtor.sql"
+    sql_file.write_text("SELECT id, name FROM debtor")
+    engine = debtor_db(tmp_path / "volare.db")
+    ids = list(range(3000))
+
+    cache = ResultCache("ENV1", 1, str(sql_file))
+    cache.plan(ids).save([500, 500])
+    frames = fetch_adaptive(ids, build_query, engine, ChunkSizer(1000, min_size=100, max_size=1000), 1, cache=cache, plan=cache.plan(ids))
+    assert [len(df) for df in frames] == [500, 500, 1000, 1000]
+    assert cache.plan(ids).sizes == [500, 500, 1000, 1000]
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+import tabs.bcp_pipeline
+from tabs.bcp_pipeline import BCPPipeline
+from utils.function import ID_TABLE_QUERY
+from utils.queries import queries
+
+
+@pytest.fixture
+def volare(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'volare.db'}")
+    monkeypatch.setattr(tabs.bcp_pipeline, "db_engine", lambda credential_type, port=None: engine)
+    loaded = []
+    monkeypatch.setattr(tabs.bcp_pipeline, "load_id_table", lambda connection, ids: loaded.append(list(ids)))
+    monkeypatch.setattr(tabs.bcp_pipeline, "release_id_source", lambda id_source: id_source[0].close())
+    return loaded
+
+
+def test_first_incremental_snapshot_run_reads_the_active_book(volare, monkeypatch):
+    pipeline = BCPPipeline(fetch_mode="snapshot", incremental="delta", use_cache=False)
+    sources = []
+    monkeypatch.setattr(pipeline, "snapshot", lambda client, client_id, id_source: sources.append(id_source) or pd.DataFrame({"ch_code": [1, 2]}))
+    monkeypatch.setattr(pipeline, "_fetch_related_frames", lambda df, client_id, port, id_source: {"info": df})
+
+    # fetch_leads_delta runs this full extract when the client has no watermark yet
+    frames = pipeline.fetch_leads("CLIENT", 7, 3306)
+    assert frames["info"]["ch_code"].tolist() == [1, 2]
+    assert str(sources[0][1]) == str(queries()["fetch_active"].subquery())
+    assert volare == []
+
+
+def test_incremental_snapshot_delta_loads_the_changed_ids(volare):
+    pipeline = BCPPipeline(fetch_mode="snapshot", incremental="delta", use_cache=False)
+    connection, id_query = pipeline._open_id_source([5, 9], 7, 3306)
+    connection.close()
+    assert id_query == ID_TABLE_QUERY
+    assert volare == [[5, 9]]
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import create_engine, text
+from utils.function import FrameBuilder, as_categories, concat_frames, fetch_frame
+
+
+def batches():
+    rng = np.random.default_rng(3)
+    for size in (500, 0, 700, 300):
+        yield pd.DataFrame({
+            "ch_code": rng.integers(0, 10**6, size),
+            "amount": rng.random(size),
+            "STATUS CODE": rng.choice(["PTP", "RPC", f"NEW {size}"], size),
+            "NOTES": rng.choice(["a", None], size),
+        })
+
+
+def test_builder_matches_concat_frames():
+    frames = FrameBuilder()
+    for df in batches():
+        frames.add(as_categories(df, ["STATUS CODE"]))
+    expected = concat_frames([as_categories(df, ["STATUS CODE"]) for df in batches()])
+    assert isinstance(expected["STATUS CODE"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(frames.frame(), expected)
+
+
+def test_builder_arrow_columns():
+    arrow = [pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype) for df in batches()]
+    frames = FrameBuilder()
+    frames.consume(arrow)
+    assert arrow == [None] * 4
+    pd.testing.assert_frame_equal(frames.frame(), pd.concat(
+        [pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype) for df in batches()], ignore_index=True))
+
+
+def test_builder_columns_missing_from_a_batch():
+    parts = [pd.DataFrame({"a": [1, 2]}), pd.DataFrame({"a": [3], "b": ["x"]}), pd.DataFrame({"b": ["y"]})]
+    frames = FrameBuilder()
+    for df in parts:
+        frames.add(df)
+    pd.testing.assert_frame_equal(frames.frame(), pd.concat(parts, ignore_index=True))
+
+
+def test_streamed_fetch_matches_buffered(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'volare.db'}")
+    pd.concat(list(batches()), ignore_index=True).to_sql("followup", engine, index=False)
+    query = text("SELECT * FROM followup")
+    streamed = fetch_frame(query, engine, chunksize=256, categories=["STATUS CODE"])
+    # Categories are unioned in batch order, so only their values compare
+    pd.testing.assert_frame_equal(streamed, fetch_frame(query, engine, categories=["STATUS CODE"]), check_categorical=False)
@@ -0,0 +1,71 @@
+import ftplib
+import itertools
+import pytest
+import utils.db
+from utils.db import ftp_session
+
+_hosts = itertools.count()
+
+
+class FakeFTP:
+    def __init__(self):
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+    def voidcmd(self, command):
+        pass
+
+
+@pytest.fixture
+def logins(monkeypatch):
+    made = []
+    monkeypatch.setattr(utils.db, "ftp_reachable", lambda hostname, port: True)
+    monkeypatch.setattr(utils.db, "connect_to_ftp", lambda *args: made.append(FakeFTP()) or made[-1])
+    return made
+
+
+def fail_in_session(host, error):
+    with pytest.raises(type(error)):
+        with ftp_session(host, 21, "user", "secret") as session:
+            session.dirs.add("/upload/2024")
+            raise error
+
+
+def wrapped(error):
+    # ensure_dir re-raises FTP errors as plain Exceptions
+    try:
+        raise Exception("Failed to create /upload") from error
+    except Exception as e:
+        return e
+
+
+@pytest.mark.parametrize("error", [
+    ftplib.error_temp("421 Service not available, closing control connection."),
+    ftplib.error_proto("unexpected reply"),
+    ftplib.error_reply("226 Transfer complete"),
+    EOFError(),
+    ConnectionResetError(),
+    wrapped(ftplib.error_temp("421 Timeout.")),
+])
+def test_broken_session_is_dropped(logins, error):
+    host = f"ftp{next(_hosts)}"
+    fail_in_session(host, error)
+    assert logins[0].closed
+    with ftp_session(host, 21, "user", "secret") as session:
+        assert session.dirs == set()
+        assert session.ftp is logins[1]
+
+
+@pytest.mark.parametrize("error", [
+    ftplib.error_perm("550 Permission denied"),
+    ftplib.error_temp("450 File unavailable"),
+    ValueError("bad artifact"),
+])
+def test_session_survives_command_errors(logins, error):
+    host = f"ftp{next(_hosts)}"
+    fail_in_session(host, error)
+    with ftp_session(host, 21, "user", "secret") as session:
+        assert session.ftp is logins[0] and not logins[0].closed
+        assert session.dirs == {"/upload/2024"}
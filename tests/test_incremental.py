@@ -0,0 +1,24 @@
+import os
+import pandas as pd
+import utils.state
+from tabs.bcp_pipeline import BCPPipeline
+from utils.state import HASH_COLUMN, load_state, save_state, with_row_hashes
+
+
+def test_empty_delta_advances_the_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.state, "STATE_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.state, "STATE_DB", os.path.join(str(tmp_path), "bcp_state.db"))
+    snapshot = with_row_hashes(pd.DataFrame({"ch_code": ["1", "2"], "name": ["ANA", "JOSE"]}))
+    save_state("ENV1", 7, "2024-05-01 00:00:00", snapshot)
+
+    pipeline = BCPPipeline(incremental="delta", use_cache=False)
+    frames = {"info": None, "delta": {"client": "ACME", "env": "ENV1", "client_id": 7, "watermark": "2024-05-02 00:00:00",
+                                      "snapshot": snapshot, "active_ids": ["1", "2"]}}
+    out = pipeline.transform_leads_delta(frames)
+
+    # No changed leads means no upload, yet the next run starts from this run's watermark
+    assert out.empty
+    watermark, saved = load_state("ENV1", 7)
+    assert watermark == "2024-05-02 00:00:00"
+    pd.testing.assert_frame_equal(saved.drop(columns=HASH_COLUMN), snapshot.drop(columns=HASH_COLUMN))
+    assert "ACME" not in pipeline._pending_states
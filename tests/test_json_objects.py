@@ -0,0 +1,49 @@
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from utils.function import json_objects
+
+FIELDS = {"Name": "name", "Balance": "balance", "Count": "count", "Endorsed": "endorsed",
+          "Status": "status", "Notes": "notes", "Missing": "not_a_column"}
+
+
+def sample(n=2000):
+    rng = np.random.default_rng(8)
+    notes = ["", 'said "call later"', "back\\slash", "tab\there", "line\nbreak", "\x01ctrl", "Ñoño café", "日本", None]
+    return pd.DataFrame({
+        "name": [f"name {i}" if i % 7 else None for i in range(n)],
+        "balance": np.where(rng.random(n) < 0.1, np.nan, rng.random(n) * 10**6),
+        "count": rng.integers(-5, 10**9, n),
+        "endorsed": pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 10**8, n), unit="s"),
+        "status": rng.choice(["PTP", "RPC", "NEGATIVE"], n),
+        "notes": [notes[i % len(notes)] for i in range(n)],
+    })
+
+
+def reference(df, fields):
+    # The per-row path json_objects replaced
+    fields = {key: col for key, col in fields.items() if col in df.columns}
+    return df.apply(lambda row: json.dumps({key: "" if pd.isna(row[col]) else str(row[col]) for key, col in fields.items()}), axis=1)
+
+
+def variants(df):
+    yield "object", df
+    yield "categorical", df.astype({"status": "category", "notes": "category", "name": "category"})
+    yield "pyarrow", pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+@pytest.mark.parametrize("arrow", [False, True])
+def test_json_objects_matches_json_dumps(arrow):
+    df = sample()
+    expected = reference(df, FIELDS).tolist()
+    for name, frame in variants(df):
+        got = json_objects(frame, FIELDS, arrow)
+        assert got.tolist() == expected, name
+        assert got.index.equals(frame.index)
+
+
+def test_json_objects_without_fields():
+    df = sample(3)
+    assert json_objects(df, {"Missing": "not_a_column"}).tolist() == ["{}"] * 3
@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+import pandas as pd
+import pyarrow as pa
+import pytest
+import utils.metrics
+from utils.metrics import frame_bytes, query_labels, query_report, record_query
+
+
+@pytest.fixture
+def metrics_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(utils.metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.metrics, "METRICS_DB", str(tmp_path / "query_metrics.db"))
+    monkeypatch.setattr(utils.metrics, "_conn", None)
+    connects = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(utils.metrics.sqlite3, "connect", lambda *a, **k: connects.append(a) or connect(*a, **k))
+    yield connects
+    utils.metrics._reset()
+
+
+def test_record_query_reuses_one_connection(metrics_db):
+    def worker(chunk):
+        with query_labels(env="ENV1", client="C", sql="fetch_info", chunk=chunk):
+            for _ in range(10):
+                record_query(0.5, 100, 1000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = query_report(env="ENV1")
+    assert report["runs"].tolist() == [40]
+    assert len(metrics_db) == 1
+
+
+def test_record_query_reopens_after_an_error(metrics_db):
+    record_query(0.1, 1, 1)
+    utils.metrics._conn.close()
+    record_query(0.1, 1, 1)  # fails on the closed connection and drops it
+    record_query(0.1, 1, 1)
+    assert len(metrics_db) == 2
+    assert query_report()["runs"].sum() == 2
+
+
+def test_frame_bytes_estimates_deep_size(monkeypatch):
+    monkeypatch.setattr(utils.metrics, "METRICS_ENABLED", True)
+    small = pd.DataFrame({"id": range(500), "notes": [f"note {i}" for i in range(500)]})
+    assert frame_bytes(small) == small.memory_usage(deep=True).sum()
+
+    df = pd.DataFrame({"id": range(100_000), "notes": [f"called debtor {i}" * (1 + i % 5) for i in range(100_000)],
+                       "status": pd.Categorical(["PTP", "RPC"] * 50_000)})
+    deep = df.memory_usage(deep=True).sum()
+    assert abs(frame_bytes(df) - deep) < 0.1 * deep
+    assert frame_bytes(df) > 3 * df.memory_usage().sum()
+
+    arrow = pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype)
+    assert frame_bytes(arrow) == arrow.memory_usage(deep=True).sum()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from utils.function import (PHONE_COLUMNS, build_phone_columns, fix_phone1, format_phone_numbers, prioritize_phones,
+                            update_phone1)
+
+
+def ordered_prioritize_phones(numbers):
+    """prioritize_phones with the numbers deduplicated in fetch order instead of through a set."""
+    cleaned = {}
+    for num in numbers:
+        tokens = [token.strip() for token in str(num).split()] if not pd.isna(num) else []
+        cleaned.update(dict.fromkeys(token for token in tokens if token.isdigit()))
+    ordered = sorted(cleaned, key=lambda x: not (x.startswith("63") or x.startswith("09")))
+    return ordered[:5] + [""] * (5 - len(ordered))
+
+
+def row_wise(df, contact_df):
+    """The phone columns as process_data built them before build_phone_columns."""
+    contact_dict = contact_df.groupby("ch_code")["number"].apply(lambda x: ordered_prioritize_phones(x.tolist())).to_dict()
+    for i, col in enumerate(PHONE_COLUMNS):
+        df[col] = df["ch_code"].map(lambda x: contact_dict.get(x, ["", "", "", "", ""])[i])
+    df = df.apply(update_phone1, axis=1)
+    df = df.apply(fix_phone1, axis=1)
+    df = df.apply(format_phone_numbers, axis=1)
+    return df[PHONE_COLUMNS]
+
+
+def contacts(debtors=2000, rows=9000, seed=6):
+    rng = np.random.default_rng(seed)
+    samples = ["639171234567", "09181234567", "9191234567", "1234567", "63917", "abc", "0917 1234567 0917",
+               "  09201234567 ", "9171234567.0", None, "28123456", "639991112222 09995556666", ""]
+    numbers = [rng.choice(samples) if rng.random() < 0.5 else f"09{rng.integers(10**8, 10**9)}" for _ in range(rows)]
+    return pd.DataFrame({
+        "ch_code": rng.integers(0, debtors + 200, rows),
+        "number": pd.Series(numbers, dtype=object).where(rng.random(rows) > 0.05, None),
+    })
+
+
+def test_ordered_prioritize_only_fixes_the_order():
+    # With at most five numbers the set-based original keeps the same ones, in arbitrary order
+    for _, numbers in contacts().groupby("ch_code")["number"]:
+        ordered = ordered_prioritize_phones(numbers.tolist())
+        if ordered[-1] == "":
+            assert sorted(ordered) == sorted(prioritize_phones(numbers.tolist()))
+
+
+def test_build_phone_columns_matches_row_wise():
+    contact_df = contacts()
+    df = pd.DataFrame({"ch_code": np.arange(2000)}, index=np.arange(2000) * 3)
+    expected = row_wise(df.copy(), contact_df)
+    phones = build_phone_columns(df["ch_code"], contact_df)
+    pd.testing.assert_frame_equal(phones, expected)
+    assert (phones["phone1"] == "101011").any() and (phones["phone5"] != "").any()
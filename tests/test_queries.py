@@ -0,0 +1,25 @@
+import gc
+import os
+import weakref
+from utils.queries import QueryRegistry
+
+
+def test_statements_follow_the_file(tmp_path):
+    sql_file = tmp_path / "fetch_x.sql"
+    sql_file.write_text("SELECT id FROM debtor WHERE client_id IN ({selected_client_id})")
+    registry = QueryRegistry(str(tmp_path))
+
+    first = registry.render("fetch_x", client_ids=[1])
+    template = weakref.ref(registry["fetch_x"])
+    assert registry["fetch_x"]._statement(None, None) is registry["fetch_x"]._statement(None, None)
+    assert len(registry.statements) == 1
+
+    sql_file.write_text("SELECT id, name FROM debtor WHERE client_id IN ({selected_client_id})")
+    os.utime(sql_file, ns=(os.stat(sql_file).st_atime_ns, os.stat(sql_file).st_mtime_ns + 10**9))
+    second = registry.render("fetch_x", client_ids=[1])
+    assert "name" in second.text and "name" not in first.text
+
+    # The old version's statement is dropped with its template
+    assert [key[1] for key in registry.statements] == [registry["fetch_x"].version]
+    gc.collect()
+    assert template() is None
@@ -0,0 +1,70 @@
+import io
+import zipfile
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from tabs.bcp_pipeline import BCPPipeline
+from utils.export import build_archive
+from utils.function import as_categories
+
+
+def stat_frame(rows=2000, seed=1):
+    """DAR rows shaped like fetch_stat.sql returns them through PyMySQL: DATE columns are datetime.date objects."""
+    rng = np.random.default_rng(seed)
+    days = [date(2024, 1, 1) + timedelta(days=int(d)) for d in rng.integers(0, 400, rows)]
+    return pd.DataFrame({
+        "DEBTOR ID": rng.integers(0, 500, rows),
+        "ACCOUNT NUMBER": [f"ACC{i:06d}" for i in rng.integers(0, 500, rows)],
+        "NAME": rng.choice(["ANA CRUZ", "JOSE RIZAL", "MARIA CLARA"], rows),
+        "STATUS CODE": rng.choice(["PTP", "RPC", "ABORT", "NA", "KEPT", "CALLBACK"], rows),
+        "REMARKS": rng.choice(["called\nno answer", "NA", "Broken Promise", "paid", None], rows),
+        "REMARKS BY": rng.choice(["agent1", "agent2"], rows),
+        "PHONE": rng.choice(["09171234567", None], rows),
+        "BARCODE DATE": [datetime(2024, 1, 1) + timedelta(seconds=int(s)) for s in rng.integers(0, 10**7, rows)],
+        "CLAIM PAID AMOUNT": rng.choice([1500.0, np.nan], rows),
+        "CLAIM PAID DATE": pd.Series(days, dtype=object).where(rng.random(rows) < 0.3, None),
+        "PTP AMOUNT": rng.choice([2000.0, 550.5, np.nan], rows),
+        "PTP DATE": pd.Series(days, dtype=object).where(rng.random(rows) < 0.6, None),
+    })
+
+
+def arrow_frame(df, dates_as="date32"):
+    """`df` as read_sql(dtype_backend="pyarrow") returns it; DATE columns as date32 or ISO strings."""
+    arrow = pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype)
+    if dates_as == "string":
+        for col in ("PTP DATE", "CLAIM PAID DATE"):
+            arrow[col] = arrow[col].astype("string[pyarrow]").astype(pd.ArrowDtype(pa.string()))
+    return arrow
+
+
+def archive_entries(df):
+    """Archive members, with each XLSX reduced to its sheet XML (the package metadata carries timestamps)."""
+    archive = zipfile.ZipFile(build_archive(df, "stat", 700))
+    entries = {}
+    for name in archive.namelist():
+        data = archive.read(name)
+        entries[name] = zipfile.ZipFile(io.BytesIO(data)).read("xl/worksheets/sheet1.xml") if name.endswith(".xlsx") else data
+    return entries
+
+
+def test_object_mode_keeps_dates():
+    out = BCPPipeline(profile="autostat").transform_stat({"dar": stat_frame()})
+    source = stat_frame()
+    kept = source.loc[out.index]
+    expected = kept["PTP DATE"].map(lambda d: d.strftime("%Y-%m-%d") if d else "")
+    assert (out["PTP DATE"] == expected).all()
+    assert (out["PTP DATE"] != "").any() and (out["CLAIM PAID DATE"] != "").any()
+
+
+@pytest.mark.parametrize("dates_as", ["date32", "string"])
+@pytest.mark.parametrize("categories", [False, True])
+def test_arrow_mode_archive_matches_object_mode(dates_as, categories):
+    expected = archive_entries(BCPPipeline(profile="autostat").transform_stat({"dar": stat_frame()}))
+    dar = arrow_frame(stat_frame(), dates_as)
+    if categories:
+        dar = as_categories(dar, ["STATUS CODE", "REMARKS BY"])
+    out = BCPPipeline(profile="autostat", dtype_backend="pyarrow").transform_stat({"dar": dar})
+    assert (out["PTP DATE"] != "").any()
+    assert archive_entries(out) == expected
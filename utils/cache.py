@@ -0,0 +1,166 @@
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+from time import time
+from utils.queries import query_key
+
+# On-disk Parquet cache for fetch_* chunk results, so retries and re-runs skip MySQL
+CACHE_DIR = "/home/ubuntu/bcp/cache"
+CACHE_TTL = int(os.getenv("BCP_CACHE_TTL", 1800))
+CACHE_MAX_BYTES = int(os.getenv("BCP_CACHE_MAX_MB", 2048)) * 1024 * 1024
+
+_evict_lock = threading.Lock()
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """Chunk results of one SQL file for one (env, client).
+
+    Entries are keyed by the SQL file hash and a fingerprint of the rendered query (which holds the
+    ID chunk); `ids` adds the ID set for single-pass queries whose text does not contain it. Frames
+    read with a `dtype_backend` are kept apart, since Parquet restores the dtypes they were written
+    with, and so are frames read with `categories`, which come back categorical. Entries older than
+    `ttl` seconds are ignored, and the whole cache is trimmed to `max_bytes` by least recent use.
+    """
+
+    def __init__(self, env, client_id, sql_file, ids=None, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, dtype_backend=None,
+                 categories=False):
+        with open(sql_file, "rb") as file:
+            sql_hash = hashlib.sha256(file.read()).hexdigest()[:12]
+        name = os.path.splitext(os.path.basename(sql_file))[0]
+        self.directory = os.path.join(CACHE_DIR, env.lower(), str(client_id))
+        self.prefix = f"{name}-{sql_hash}" + (f"-{dtype_backend}" if dtype_backend else "") + ("-categories" if categories else "")
+        self.salt = _digest(*sorted(map(str, ids))) if ids is not None else ""
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def _path(self, query):
+        return os.path.join(self.directory, f"{self.prefix}-{_digest(query_key(query), self.salt)[:24]}.parquet")
+
+    def get(self, query):
+        """Return the cached frame for `query`, or None when missing or expired."""
+        path = self._path(query)
+        try:
+            modified = os.path.getmtime(path)
+            if time() - modified > self.ttl:
+                return None
+            df = pd.read_parquet(path)
+            # atime tracks use for LRU eviction; mtime keeps the write time for the TTL
+            os.utime(path, (time(), modified))
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.hits += 1
+        return df
+
+    def plan(self, ids):
+        """Chunk plan of an adaptive fetch over `ids` (in order), expiring with the entries."""
+        return ChunkPlan(os.path.join(self.directory, f"{self.prefix}-plan-{_digest(*map(str, ids))[:24]}.json"), self.ttl)
+
+    def path(self, query):
+        return self._path(query)
+
+    def link(self, query, source):
+        """Add the Parquet file `source` as the entry for `query` without copying it; False if it cannot be linked."""
+        if not link_file(source, self._path(query)):
+            return False
+        evict(self.max_bytes, self.ttl)
+        return True
+
+    def put(self, query, df):
+        """Store `df` for `query`; frames Parquet cannot hold are simply not cached."""
+        path = self._path(query)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            df.to_parquet(f"{path}.{threading.get_ident()}.tmp", index=False)
+            os.replace(f"{path}.{threading.get_ident()}.tmp", path)
+        except Exception as e:
+            print(f"Result not cached: {e}")
+            return
+        evict(self.max_bytes, self.ttl)
+
+class ChunkPlan:
+    """Chunk sizes an adaptive fetch used for one ID list, so the next fetch of the same IDs cuts the
+    same chunks and finds them cached whatever size was learned since. `fallback` is another plan
+    read when this one has none and written along with it."""
+
+    def __init__(self, path, ttl=None, fallback=None):
+        self.path = path
+        self.ttl = ttl
+        self.fallback = fallback
+
+    @property
+    def sizes(self):
+        try:
+            if self.ttl is not None and time() - os.path.getmtime(self.path) > self.ttl:
+                raise OSError("expired")
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return self.fallback.sizes if self.fallback is not None else []
+
+    def save(self, sizes):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(list(sizes), file)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            print(f"Chunk plan not saved: {e}")
+        if self.fallback is not None:
+            self.fallback.save(sizes)
+
+def link_file(source, target):
+    """Hard-link `source` as `target`, so two stores share one copy; False when the filesystem cannot."""
+    tmp = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.link(source, tmp)
+        os.replace(tmp, target)
+        return True
+    except OSError:
+        return False
+
+def _entries():
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith((".parquet", ".json")):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_atime, stat.st_mtime, stat.st_size, path
+
+def evict(max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+    """Delete the entries written more than `ttl` seconds ago, then least recently used entries
+    until the cache fits in `max_bytes`."""
+    with _evict_lock:
+        cutoff = time() - ttl
+        entries = []
+        for used, modified, size, path in sorted(_entries()):
+            # Expired entries are never read again, and they hold debtor data
+            if modified < cutoff:
+                try:
+                    os.remove(path)
+                    continue
+                except OSError:
+                    pass
+            entries.append((size, path))
+        total = sum(size for size, _ in entries)
+        for size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+def clear_cache():
+    evict(0)
@@ -0,0 +1,259 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+import pandas as pd
+from time import time
+from datetime import datetime
+from utils.queries import query_key
+from utils.cache import ChunkPlan, link_file
+
+# Stage checkpoints of the CLI runs (`bcp.py --checkpoint`): runs/<run-id>/<env>/manifest.json records
+# every completed stage per client, with its output next to it, so `bcp.py --resume <run-id>` picks up
+# where a run died. The outputs hold debtor data, so runs idle for RUNS_RETENTION_DAYS are pruned.
+RUNS_DIR = "/home/ubuntu/bcp/runs"
+RUNS_RETENTION_DAYS = int(os.getenv("BCP_RUNS_RETENTION_DAYS", 3))
+
+def new_run_id():
+    return datetime.now().strftime('%Y%m%d-%H%M%S')
+
+def prune_runs(days=RUNS_RETENTION_DAYS, keep=None):
+    """Delete the runs not updated in the last `days` days, except `keep`; returns the deleted run IDs."""
+    if not os.path.isdir(RUNS_DIR):
+        return []
+    cutoff = time() - days * 86400
+    pruned = []
+    for run_id in sorted(os.listdir(RUNS_DIR)):
+        path = os.path.join(RUNS_DIR, run_id)
+        if run_id == keep or not os.path.isdir(path):
+            continue
+        # Every checkpoint write rewrites its env's manifest, so the newest manifest dates the run
+        updated = [os.path.getmtime(os.path.join(root, "manifest.json"))
+                   for root, _, files in os.walk(path) if "manifest.json" in files]
+        if max(updated, default=os.path.getmtime(path)) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            pruned.append(run_id)
+    return pruned
+
+def run_envs(run_id):
+    """Environments that have a manifest in the given run."""
+    path = os.path.join(RUNS_DIR, run_id)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No checkpoints found for run {run_id} in {RUNS_DIR}")
+    return sorted(name.upper() for name in os.listdir(path) if os.path.isfile(os.path.join(path, name, "manifest.json")))
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def write_frame(df, path_base):
+    """Write `df` as Parquet, or pickle when Parquet cannot hold its mixed object columns; returns the file name."""
+    try:
+        df.to_parquet(f"{path_base}.parquet.tmp")
+        os.replace(f"{path_base}.parquet.tmp", f"{path_base}.parquet")
+        return os.path.basename(f"{path_base}.parquet")
+    except Exception:
+        if os.path.exists(f"{path_base}.parquet.tmp"):
+            os.remove(f"{path_base}.parquet.tmp")
+    df.to_pickle(f"{path_base}.pkl.tmp")
+    os.replace(f"{path_base}.pkl.tmp", f"{path_base}.pkl")
+    return os.path.basename(f"{path_base}.pkl")
+
+def read_frame(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+
+class RunCheckpoint:
+    """Completed stages of one environment's run.
+
+    Stage outputs live in <run>/<env>/<client_id>/ and are dropped once every server has the
+    client's archive; the manifest keeps the client marked done so a resumed run skips it.
+    """
+
+    def __init__(self, run_id, env, resume=False):
+        self.run_id = run_id
+        self.env = env
+        self.directory = os.path.join(RUNS_DIR, run_id, env.lower())
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self._lock = threading.RLock()
+        self._ids = {}
+
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {"run_id": run_id, "env": env, "started": _now(), "clients": {}}
+        os.makedirs(self.directory, exist_ok=True)
+        self._save()
+
+    def _save(self):
+        self.manifest["updated"] = _now()
+        with open(f"{self.manifest_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(f"{self.manifest_path}.tmp", self.manifest_path)
+
+    def _client(self, client_id):
+        return self.manifest["clients"].setdefault(
+            str(client_id), {"name": None, "stages": {}, "uploads": {}, "done": False, "rows": 0}
+        )
+
+    def _client_dir(self, client_id):
+        path = os.path.join(self.directory, str(client_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def register(self, client_name, client_id):
+        with self._lock:
+            self._ids[client_name] = str(client_id)
+            self._client(client_id)["name"] = client_name
+            self._save()
+
+    def client_key(self, client_name):
+        return self._ids.get(client_name)
+
+    def is_done(self, client_id):
+        with self._lock:
+            return self._client(client_id)["done"]
+
+    def rows(self, client_id):
+        with self._lock:
+            return self._client(client_id)["rows"]
+
+    def load(self, client_id, stage):
+        """Return (found, frame) for a completed stage; a stage that produced nothing is (True, None)."""
+        with self._lock:
+            entry = self._client(client_id)["stages"].get(stage)
+        if entry is None:
+            return False, None
+        if entry["file"] is None:
+            return True, None
+        try:
+            return True, read_frame(os.path.join(self.directory, str(client_id), entry["file"]))
+        except (OSError, ValueError):
+            return False, None
+
+    def save(self, client_id, stage, df):
+        file = None if df is None else write_frame(df, os.path.join(self._client_dir(client_id), stage))
+        with self._lock:
+            self._client(client_id)["stages"][stage] = {
+                "file": file, "rows": None if df is None else len(df), "at": _now()
+            }
+            self._save()
+
+    def load_artifact(self, client_id):
+        with self._lock:
+            entry = self._client(client_id)["stages"].get("export")
+        if entry is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, str(client_id), entry["file"]), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        return {"name": entry["name"], "base": entry["base"], "data": data, "size": entry["size"], "sha256": entry["sha256"]}
+
+    def save_artifact(self, client_id, artifact, rows=None):
+        path = os.path.join(self._client_dir(client_id), "export.zip")
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(artifact["data"])
+        os.replace(f"{path}.tmp", path)
+        with self._lock:
+            self._client(client_id)["stages"]["export"] = {
+                "file": "export.zip", "name": artifact["name"], "base": artifact["base"],
+                "size": artifact["size"], "sha256": artifact["sha256"], "rows": rows, "at": _now()
+            }
+            self._save()
+
+    def exported_rows(self, client_id):
+        """Row count of the client's archive once it is exported in this run, else None."""
+        with self._lock:
+            entry = self._client(client_id)["stages"].get("export")
+        if entry is None or not os.path.exists(os.path.join(self.directory, str(client_id), entry["file"])):
+            return None
+        return entry.get("rows") or 0
+
+    def drop_frames(self, client_id):
+        """Drop the stage frames and fetched chunks of an exported client, keeping its archive for the remaining uploads."""
+        with self._lock:
+            stages = self._client(client_id)["stages"]
+            for stage in [stage for stage in stages if stage != "export"]:
+                del stages[stage]
+            self._save()
+        directory = os.path.join(self.directory, str(client_id))
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name != "export.zip":
+                os.remove(path)
+
+    def uploads(self, client_id):
+        """Servers that already received this client's archive, with the remote file name."""
+        with self._lock:
+            return dict(self._client(client_id)["uploads"])
+
+    def mark_uploaded(self, client_id, server, filename):
+        with self._lock:
+            self._client(client_id)["uploads"][server] = {"file": filename, "at": _now()}
+            self._save()
+
+    def finish(self, client_id, rows):
+        """Mark the client done and drop its stage outputs."""
+        with self._lock:
+            client = self._client(client_id)
+            client.update(done=True, rows=rows, stages={})
+            self._save()
+        shutil.rmtree(os.path.join(self.directory, str(client_id)), ignore_errors=True)
+
+    def chunk_store(self, client_id, sql_file, fallback=None, dtype_backend=None, categories=False):
+        name = os.path.splitext(os.path.basename(sql_file))[0] + (f"-{dtype_backend}" if dtype_backend else "") + ("-categories" if categories else "")
+        return ChunkStore(os.path.join(self.directory, str(client_id), "chunks", name), fallback)
+
+
+class ChunkStore:
+    """Per-run store of fetched chunks with the ResultCache interface, so a resumed fetch only
+    queries the chunks it never finished; `fallback` is the shared ResultCache, if any."""
+
+    def __init__(self, directory, fallback=None):
+        self.directory = directory
+        self.fallback = fallback
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def _path(self, query):
+        return os.path.join(self.directory, hashlib.sha256(query_key(query).encode("utf-8")).hexdigest()[:24])
+
+    def get(self, query):
+        path = self._path(query)
+        df = None
+        for candidate in (f"{path}.parquet", f"{path}.pkl"):
+            if os.path.exists(candidate):
+                try:
+                    df = read_frame(candidate)
+                except (OSError, ValueError, pickle.UnpicklingError):
+                    df = None
+                break
+        if df is None and self.fallback is not None:
+            df = self.fallback.get(query)
+            if df is not None and not link_file(self.fallback.path(query), f"{path}.parquet"):
+                self._write(query, df)
+        if df is not None:
+            with self._lock:
+                self.hits += 1
+        return df
+
+    def _write(self, query, df):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, write_frame(df, self._path(query)))
+
+    def plan(self, ids):
+        digest = hashlib.sha256("\0".join(map(str, ids)).encode("utf-8")).hexdigest()[:24]
+        fallback = self.fallback.plan(ids) if self.fallback is not None else None
+        return ChunkPlan(os.path.join(self.directory, f"plan-{digest}.json"), fallback=fallback)
+
+    def put(self, query, df):
+        path = self._write(query, df)
+        # The shared cache links the same file, so each chunk is stored once
+        if self.fallback is not None and not (path.endswith(".parquet") and self.fallback.link(query, path)):
+            self.fallback.put(query, df)
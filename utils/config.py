@@ -0,0 +1,94 @@
+import os
+import pickle
+import threading
+import pandas as pd
+
+# config.xlsx (column mappings, one sheet per client) compiled once per file version: every sheet
+# is read in a single pass, kept in memory and revalidated against the file's mtime/size on each
+# lookup. A pickle sidecar next to the workbook lets new processes skip the Excel parse until the
+# workbook changes.
+# An optional "Filters" sheet adds remove_data exclusions per client (Client "*" applies to all).
+CONFIG_PATH = "/home/ubuntu/bcp/config/config.xlsx"
+SIDECAR_ENABLED = os.getenv("BCP_CONFIG_SIDECAR", "1") != "0"
+SIDECAR_VERSION = 2
+
+MAPPING_COLUMNS = ("Database Column", "Mapped Column")
+FILTER_SHEET = "Filters"
+FILTER_COLUMNS = ("Client", "Rule", "Value")
+FILTER_RULES = ("remark contains", "status equals", "status contains")
+
+_compiled = {}
+_lock = threading.Lock()
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _compile(path):
+    sheets = pd.read_excel(path, sheet_name=None)
+    mappings = {
+        name: list(zip(df[MAPPING_COLUMNS[0]], df[MAPPING_COLUMNS[1]]))
+        for name, df in sheets.items()
+        if all(column in df.columns for column in MAPPING_COLUMNS)
+    }
+    filters = sheets.get(FILTER_SHEET)
+    if filters is None or not all(column in filters.columns for column in FILTER_COLUMNS):
+        filters = []
+    else:
+        filters = [
+            (str(client).strip(), str(rule).strip().lower(), str(value))
+            for client, rule, value in filters[list(FILTER_COLUMNS)].dropna().itertuples(index=False)
+        ]
+    return {"sheets": sheets, "mappings": mappings, "filters": filters}
+
+def _load_sidecar(path, signature):
+    try:
+        with open(f"{path}.cache.pkl", "rb") as file:
+            cached = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if cached.get("version") != SIDECAR_VERSION or cached.get("signature") != signature:
+        return None
+    return cached["workbook"]
+
+def _save_sidecar(path, signature, workbook):
+    try:
+        with open(f"{path}.cache.pkl.tmp", "wb") as file:
+            pickle.dump({"version": SIDECAR_VERSION, "signature": signature, "workbook": workbook}, file)
+        os.replace(f"{path}.cache.pkl.tmp", f"{path}.cache.pkl")
+    except OSError as e:
+        print(f"Config sidecar not written for {path}: {e}")
+
+def workbook(path):
+    """Compiled workbook for `path`: {"sheets": {name: DataFrame}, "mappings": {name: [(db_col, mapped_col)]},
+    "filters": [(client, rule, value)]}."""
+    signature = _signature(path)
+    with _lock:
+        entry = _compiled.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        compiled = _load_sidecar(path, signature) if SIDECAR_ENABLED else None
+        if compiled is None:
+            compiled = _compile(path)
+            if SIDECAR_ENABLED:
+                _save_sidecar(path, signature, compiled)
+        _compiled[path] = (signature, compiled)
+        return compiled
+
+def mappings(sheet_name, path=CONFIG_PATH):
+    """Column mappings of one sheet; like pd.read_excel, a missing sheet raises ValueError."""
+    compiled = workbook(path)
+    if sheet_name not in compiled["sheets"]:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    if sheet_name not in compiled["mappings"]:
+        raise KeyError(f"Sheet {sheet_name} in {path} has no {' / '.join(MAPPING_COLUMNS)} columns")
+    return list(compiled["mappings"][sheet_name])
+
+def filter_rules(client, path=CONFIG_PATH):
+    """Extra remove_data exclusions for `client` from the Filters sheet, as ((rule, value), ...)."""
+    rules = tuple((rule, value) for name, rule, value in workbook(path)["filters"] if name in ("*", client))
+    unknown = sorted({rule for rule, _ in rules} - set(FILTER_RULES))
+    if unknown:
+        raise ValueError(f"{FILTER_SHEET} sheet in {path}: unknown rule(s) {', '.join(unknown)}; expected {', '.join(FILTER_RULES)}")
+    return rules
@@ -1,21 +1,101 @@
 import os
+import time
+import atexit
+import socket
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine
 import paramiko
 import streamlit as st
-from ftplib import FTP
+from streamlit import runtime
+from ftplib import FTP, all_errors as ftp_errors, error_proto, error_reply, error_temp
+
+# env_path = os.path.join(os.getcwd(), 'config', '.env')
+ENV_PATH = "/home/ubuntu/bcp/config/.env"
+
+# Connection pool settings shared by every engine in the registry (overridable from .env)
+POOL_SETTINGS = {
+    "pool_size": ("DB_POOL_SIZE", 5),
+    "max_overflow": ("DB_MAX_OVERFLOW", 5),
+    "pool_recycle": ("DB_POOL_RECYCLE", 1800),
+    "pool_timeout": ("DB_POOL_TIMEOUT", 60),
+}
+
+# FTP session pool: quick TCP probe before logging in, how long an unreachable host is skipped,
+# and how long a session may sit idle before it is NOOP-checked on checkout
+FTP_PROBE_TIMEOUT = 3
+FTP_DOWN_TTL = 300
+FTP_IDLE_CHECK = 30
+
+_env_loaded = False
+# Optional cross-process cap on concurrent FTP uploads, installed by the bcp.py runner
+_upload_slots = None
+
+def _new_registry():
+    return {"engines": {}, "query_slots": {}, "ftp_sessions": {}, "ftp_down": {}, "lock": threading.Lock()}
+
+_local_registry = _new_registry()
+
+def load_env():
+    """Load the shared .env file once per process."""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv(dotenv_path=ENV_PATH)
+        _env_loaded = True
+
+@st.cache_resource(show_spinner=False)
+def _shared_registry():
+    # One registry per Streamlit server process, shared by every tab, session and rerun
+    return _new_registry()
+
+def _engine_registry():
+    return _shared_registry() if runtime.exists() else _local_registry
 
 def db_engine(credential_type, port=None):
+    """Return the pooled engine for (credential_type, port), creating it on first use."""
+    load_env()
+    key = (credential_type.lower(), str(port) if port is not None else None)
+    registry = _engine_registry()
+
+    with registry["lock"]:
+        engine = registry["engines"].get(key)
+        if engine is None:
+            engine = _create_db_engine(credential_type, port)
+            if engine is not None:
+                registry["engines"][key] = engine
+        return engine
+
+def query_slot(bind):
+    """Semaphore capping the queries in flight against one database (one engine URL, i.e. one env).
+
+    The cap comes from DB_MAX_QUERIES and defaults to the engine's pool size plus overflow, so
+    concurrent clients queue here instead of timing out on the connection pool.
+    """
+    engine = getattr(bind, "engine", bind)
+    key = engine.url.render_as_string(hide_password=True)
+    registry = _engine_registry()
+    with registry["lock"]:
+        slot = registry["query_slots"].get(key)
+        if slot is None:
+            default = sum(int(os.getenv(POOL_SETTINGS[option][0], POOL_SETTINGS[option][1]))
+                          for option in ("pool_size", "max_overflow"))
+            slot = registry["query_slots"][key] = threading.BoundedSemaphore(int(os.getenv("DB_MAX_QUERIES", default)))
+        return slot
+
+def dispose_engines():
+    """Close every pooled connection and empty the engine registry."""
+    registry = _engine_registry()
+    with registry["lock"]:
+        for engine in registry["engines"].values():
+            engine.dispose()
+        registry["engines"].clear()
+
+atexit.register(dispose_engines)
+
+def _create_db_engine(credential_type, port=None):
     try:
-     
-        # Get the absolute path of the current file's directory
-        current_working_dir = os.getcwd()
-       
-        # env_path = os.path.join(current_working_dir, 'config', '.env')
-        env_path = "/home/ubuntu/bcp/config/.env"
-        load_dotenv(dotenv_path=env_path)
-      
         # Convert credential_type to lowercase for consistency
         credential_type = credential_type.lower()
 
@@ -40,8 +120,12 @@ def db_engine(credential_type, port=None):
         engine_url = 'mysql+pymysql://{user}:{pass}@{host}:{port}/{db}'
         
         engine_credentials = engine_url.format(**creds)
+        pool_options = {
+            option: int(os.getenv(env_var, default))
+            for option, (env_var, default) in POOL_SETTINGS.items()
+        }
         # Create and return the SQLAlchemy engine
-        return create_engine(engine_credentials)
+        return create_engine(engine_credentials, pool_pre_ping=True, **pool_options)
     
     except Exception as e:
         error_message = f"An error occurred while creating the database engine: {str(e)}"
@@ -63,6 +147,160 @@ def connect_to_ftp(hostname, port, username, password):
     except Exception as e:
         print(f"Failed to connect to FTP: {str(e)}")
         return None
+
+class FTPSession:
+    """A pooled FTP login plus the directories already known to exist on that server."""
+
+    def __init__(self, hostname, port, username, password):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.ftp = None
+        self.dirs = set()
+        self.lock = threading.Lock()
+        self.last_used = 0.0
+
+    def connect(self):
+        self.close()
+        self.ftp = connect_to_ftp(self.hostname, self.port, self.username, self.password)
+        self.last_used = time.monotonic()
+        return self.ftp is not None
+
+    def alive(self):
+        """True if the login is usable; sessions idle for FTP_IDLE_CHECK seconds are NOOP-checked."""
+        if self.ftp is None:
+            return False
+        if time.monotonic() - self.last_used < FTP_IDLE_CHECK:
+            return True
+        try:
+            self.ftp.voidcmd("NOOP")
+            return True
+        except ftp_errors:
+            return False
+
+    def ensure_dir(self, path):
+        """Create any missing component of `path`, cwd into it and return the directories created."""
+        created = []
+        current_path = ""
+        for component in [p for p in path.split("/") if p]:
+            current_path = f"{current_path}/{component}"
+            if current_path in self.dirs:
+                continue
+            try:
+                self.ftp.cwd(current_path)
+            except ftp_errors:
+                try:
+                    self.ftp.mkd(current_path)
+                except ftp_errors as e:
+                    if "550" in str(e):
+                        raise Exception(f"Permission denied creating {current_path} on {self.hostname}. Check FTP user permissions.") from e
+                    raise Exception(f"Failed to create {current_path} on {self.hostname}: {e}") from e
+                created.append(current_path)
+            self.dirs.add(current_path)
+        self.ftp.cwd(path)
+        return created
+
+    def close(self):
+        if self.ftp is not None:
+            try:
+                self.ftp.quit()
+            except Exception:
+                try:
+                    self.ftp.close()
+                except Exception:
+                    pass
+        self.ftp = None
+
+def ftp_reachable(hostname, port):
+    """Fast TCP probe; a host that failed within FTP_DOWN_TTL seconds is skipped without retrying."""
+    registry = _engine_registry()
+    key = (hostname, int(port))
+    with registry["lock"]:
+        failed_at = registry["ftp_down"].get(key)
+    if failed_at is not None and time.monotonic() - failed_at < FTP_DOWN_TTL:
+        return False
+
+    try:
+        socket.create_connection(key, timeout=FTP_PROBE_TIMEOUT).close()
+    except OSError as e:
+        print(f"FTP server {hostname}:{port} is unreachable: {e}")
+        with registry["lock"]:
+            registry["ftp_down"][key] = time.monotonic()
+        return False
+
+    with registry["lock"]:
+        registry["ftp_down"].pop(key, None)
+    return True
+
+def _session_broken(error):
+    """True when `error`, or an error it wraps, leaves the control connection unusable: a socket
+    error, a reply out of sequence, or the server closing the session (421)."""
+    while error is not None:
+        if isinstance(error, (OSError, EOFError, error_proto, error_reply)):
+            return True
+        if isinstance(error, error_temp) and str(error).startswith("421"):
+            return True
+        error = error.__cause__
+    return False
+
+@contextmanager
+def ftp_session(hostname, port, username, password):
+    """Check out the pooled session for (hostname, port, username), logging in only when needed.
+
+    Yields None when the server is down or the login fails. The session is held exclusively
+    for the duration of the block and is logged out if the block hits a connection error.
+    """
+    registry = _engine_registry()
+    key = (hostname, int(port), username)
+    with registry["lock"]:
+        session = registry["ftp_sessions"].get(key)
+        if session is None:
+            session = registry["ftp_sessions"][key] = FTPSession(hostname, port, username, password)
+
+    with session.lock:
+        if not session.alive() and not (ftp_reachable(hostname, port) and session.connect()):
+            yield None
+            return
+        try:
+            yield session
+        except Exception as e:
+            # A broken control connection must not be handed to the next caller
+            if _session_broken(e):
+                session.close()
+                session.dirs.clear()
+            raise
+        finally:
+            session.last_used = time.monotonic()
+
+def close_ftp_sessions():
+    """Log out of every pooled FTP session."""
+    registry = _engine_registry()
+    with registry["lock"]:
+        sessions = list(registry["ftp_sessions"].values())
+        registry["ftp_sessions"].clear()
+    for session in sessions:
+        with session.lock:
+            session.close()
+
+atexit.register(close_ftp_sessions)
+
+def set_upload_slots(semaphore):
+    """Install a (multiprocessing) semaphore that every FTP upload in this process must hold."""
+    global _upload_slots
+    _upload_slots = semaphore
+
+@contextmanager
+def upload_slot():
+    """Hold one global FTP upload slot for the block; a no-op when no cap is installed."""
+    if _upload_slots is None:
+        yield
+        return
+    _upload_slots.acquire()
+    try:
+        yield
+    finally:
+        _upload_slots.release()
     
 def connect_to_sftp(hostname, port, username, password):
     """Establish a connection to the SFTP server and return the SFTP client."""
@@ -0,0 +1,180 @@
+import io
+import re
+import hashlib
+import math
+import zipfile
+import pandas as pd
+import pyarrow as pa
+from numbers import Integral, Real
+from xml.sax.saxutils import escape
+
+# Same control characters openpyxl refuses to write
+ILLEGAL_CHARACTERS_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+XLSX_ROW_BATCH = 1000
+
+_SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_RELATIONSHIP_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_CONTENT_TYPES = _XML_HEADER + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = _XML_HEADER + (
+    f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{_RELATIONSHIP_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = _XML_HEADER + (
+    f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{_RELATIONSHIP_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{_RELATIONSHIP_NS}/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style 1 is the bold header pandas applies in to_excel
+_STYLES = _XML_HEADER + (
+    f'<styleSheet xmlns="{_SPREADSHEET_NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _workbook(sheet_name):
+    return _XML_HEADER + (
+        f'<workbook xmlns="{_SPREADSHEET_NS}" xmlns:r="{_RELATIONSHIP_NS}">'
+        f'<sheets><sheet name="{escape(sheet_name, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _text_cell(value, style=""):
+    value = ILLEGAL_CHARACTERS_RE.sub("", value)
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+
+
+def _cell(value):
+    """Render one value as a <c> element the way to_excel would type it."""
+    if isinstance(value, str):
+        return _text_cell(value) if value else "<c/>"
+    if value is None or pd.isna(value):
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, Integral):
+        return f"<c><v>{int(value)}</v></c>"
+    if isinstance(value, Real):
+        value = float(value)
+        return f"<c><v>{value!r}</v></c>" if math.isfinite(value) else "<c/>"
+    return _text_cell(str(value))
+
+
+def _column_values(series):
+    """Python values of one column; Arrow-backed columns are converted straight from their buffers."""
+    if not isinstance(series.dtype, pd.ArrowDtype):
+        return list(series)
+    values = pa.array(series)
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        # Bulk conversion to str objects (None for nulls); to_pylist builds a scalar per value
+        return values.to_numpy(zero_copy_only=False)
+    return values.to_pylist()
+
+
+def _column_cells(series):
+    """Rendered <c> elements of one column; a categorical renders each category once."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        cells = [_cell(value) for value in series.cat.categories] + ["<c/>"]
+        return [cells[code] for code in series.cat.codes.tolist()]
+    return list(map(_cell, _column_values(series)))
+
+
+def write_xlsx(df, fileobj, sheet_name="Sheet1"):
+    """Stream `df` into `fileobj` as a single-sheet XLSX.
+
+    Rows are rendered straight into the worksheet part in batches of XLSX_ROW_BATCH, so
+    neither a workbook object graph nor a temporary file is created. `fileobj` only has to
+    be writable, e.g. an entry opened with ZipFile.open(name, "w").
+    """
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as xlsx:
+        xlsx.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        xlsx.writestr("_rels/.rels", _ROOT_RELS)
+        xlsx.writestr("xl/workbook.xml", _workbook(sheet_name))
+        xlsx.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        xlsx.writestr("xl/styles.xml", _STYLES)
+
+        with xlsx.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write((_XML_HEADER + f'<worksheet xmlns="{_SPREADSHEET_NS}"><sheetData>').encode("utf-8"))
+
+            header = "".join(_text_cell(str(col), ' s="1"') for col in df.columns)
+            sheet.write(f'<row r="1">{header}</row>'.encode("utf-8"))
+
+            for start in range(0, len(df), XLSX_ROW_BATCH):
+                batch = df.iloc[start:start + XLSX_ROW_BATCH]
+                columns = [_column_cells(batch.iloc[:, i]) for i in range(batch.shape[1])]
+                rows = (
+                    f'<row r="{row_number}">{"".join(row)}</row>'
+                    for row_number, row in enumerate(zip(*columns), start=start + 2)
+                )
+                sheet.write("".join(rows).encode("utf-8"))
+
+            sheet.write(b"</sheetData></worksheet>")
+
+
+def build_archive(df, filename_base, chunk_size):
+    """Build the upload ZIP in memory: one CSV and one XLSX per `chunk_size` rows.
+
+    Both formats are streamed directly into their ZIP entries, so nothing touches /tmp.
+    Returns a BytesIO positioned at the start of the archive.
+    """
+    total_rows = len(df)
+    num_chunks = (total_rows + chunk_size - 1) // chunk_size
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for i in range(num_chunks):
+            chunk = df.iloc[i * chunk_size:min((i + 1) * chunk_size, total_rows)]
+            part_suffix = f"_part{i+1}" if num_chunks > 1 else ""
+
+            with zipf.open(f"{filename_base}{part_suffix}.csv", "w") as entry:
+                with io.TextIOWrapper(entry, encoding="utf-8", newline="") as csv_file:
+                    chunk.to_csv(csv_file, index=False)
+
+            with zipf.open(f"{filename_base}{part_suffix}.xlsx", "w") as entry:
+                write_xlsx(chunk, entry)
+
+    buffer.seek(0)
+    return buffer
+
+
+def build_artifact(df, filename_base, chunk_size):
+    """Build the upload ZIP once and address it by content.
+
+    Returns a dict with the archive `name` (and its `base`), raw `data`, `size` and `sha256` digest; every
+    FTP server gets the same bytes, so the digest identifies what was sent where.
+    """
+    data = build_archive(df, filename_base, chunk_size).getvalue()
+    return {
+        "name": f"{filename_base}.zip",
+        "base": filename_base,
+        "data": data,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
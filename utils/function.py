@@ -1,7 +1,22 @@
+import re
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from time import time
+from functools import lru_cache
+from itertools import chain
+from json.encoder import encode_basestring_ascii
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from threading import current_thread, local
 from sqlalchemy import text
+from sqlalchemy.engine import Engine
 import streamlit as st
+from utils.db import query_slot
+from utils.config import mappings as config_mappings, filter_rules as config_filter_rules
+from utils.metrics import query_labels, current_labels, explain_query, record_query, frame_bytes
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 def get_raw_file(file, sheet_name=None, engine=None):
     try:
@@ -24,34 +39,443 @@ def read_sql_file(filename):
         return file.read()
     
     
-def fetch_data(query, connection):
+def _statement(query):
+    # Plain SQL strings, or text() constructs with bound values from the query registry (utils/queries.py)
+    return text(query) if isinstance(query, str) else query
+
+def _read_options(dtype, dtype_backend):
+    # read_sql rejects dtype_backend=None, so it is only passed when a backend is chosen
+    return {"dtype": dtype, "dtype_backend": dtype_backend} if dtype_backend else {"dtype": dtype}
+
+# Seconds the last query on this thread held its query slot, i.e. its latency without queueing
+_query_timing = local()
+
+def _log(message):
+    # Clients run concurrently in the cron log, so the line carries the client its query belongs to
+    client = current_labels().get("client")
+    print(f"[{client}] {message}" if client else message)
+
+def fetch_data(query, connection, chunksize=None, dtype=None, dtype_backend=None, categories=None):
+    """Run `query` (SQL text or a text() construct) and return a DataFrame.
+
+    With `chunksize`, return a generator of DataFrame batches read through an unbuffered
+    server-side cursor instead, so only one batch of raw rows is held at a time.
+    `dtype_backend="pyarrow"` reads the result into ArrowDtype columns (string[pyarrow] etc.);
+    the `categories` columns are stored as categoricals (see as_categories).
+    """
+    if chunksize:
+        return _stream_data(query, connection, chunksize, dtype, dtype_backend, categories)
+
     try:
         start_time = time()
-        df = pd.read_sql(text(query), con=connection)
+        # Queue behind the per-environment cap on concurrent queries
+        with query_slot(connection):
+            plan = explain_query(query, connection)
+            slot_start = time()
+            df = pd.read_sql(_statement(query), con=connection, **_read_options(dtype, dtype_backend))
+            _query_timing.seconds = time() - slot_start
+        df = as_categories(df, categories)
+        record_query(_query_timing.seconds, len(df), frame_bytes(df), plan)
         query_duration = time() - start_time
-        print(f"Query executed in {query_duration:.2f} seconds")
+        _log(f"Query executed in {query_duration:.2f} seconds")
         return df
     except Exception as e:
-        print(f"Error executing query: {e}")
+        _log(f"Error executing query: {e}")
         raise RuntimeError(f"Failed to execute the query: {e}")
-    
-def remove_data(result, status_code_col='STATUS CODE', remark_col='REMARK'):
+
+def _stream_data(query, connection, chunksize, dtype=None, dtype_backend=None, categories=None):
+    # stream_results switches PyMySQL to an SSCursor
+    statement = _statement(query).execution_options(stream_results=True)
     try:
-        result = result[
-            ~result[remark_col].isna() &
-            (result[remark_col].str.strip() != "") &
-            ~result[remark_col].str.contains(
-                r"Updates when case reassign to another collector|New Contact Details Added|Broken Promise|New Assignment - OS", 
-                case=False, 
-                na=False
-            ) &
-            ~result[status_code_col].isna() &
-            (result[status_code_col].str.strip() != "") &
-            ~result[status_code_col].str.lower().isin(['new', 'ptp', 'none']) &
-            ~result[status_code_col].str.contains(r"ABORT|REACTIVE|PULLOUT|PULL OUT|HOLD EFFORT|LOCKED", regex=True, case=False, na=False)
-        ]
-        
-        return result
+        start_time = time()
+        total_rows = total_bytes = 0
+        with ExitStack() as stack:
+            # The slot is held until the cursor is drained, since the connection stays busy
+            stack.enter_context(query_slot(connection))
+            if isinstance(connection, Engine):
+                connection = stack.enter_context(connection.connect())
+            plan = explain_query(query, connection)
+            slot_start = time()
+            for df in pd.read_sql(statement, con=connection, chunksize=chunksize, **_read_options(dtype, dtype_backend)):
+                df = as_categories(df, categories)
+                total_rows += len(df)
+                total_bytes += frame_bytes(df)
+                yield df
+            _query_timing.seconds = time() - slot_start
+        record_query(_query_timing.seconds, total_rows, total_bytes, plan)
+        query_duration = time() - start_time
+        _log(f"Query streamed {total_rows} rows in {query_duration:.2f} seconds")
+    except Exception as e:
+        _log(f"Error executing query: {e}")
+        raise RuntimeError(f"Failed to execute the query: {e}")
+
+def fetch_frame(query, connection, chunksize=None, dtype_backend=None, categories=None):
+    """Run `query` into one DataFrame, streaming it in `chunksize` batches when given.
+
+    Streamed batches are folded into a FrameBuilder as they arrive, so each one is freed before
+    the next is read.
+    """
+    if not chunksize:
+        return fetch_data(query, connection, dtype_backend=dtype_backend, categories=categories)
+
+    frames = FrameBuilder()
+    for df in fetch_data(query, connection, chunksize=chunksize, dtype_backend=dtype_backend, categories=categories):
+        frames.add(df)
+    return frames.frame() if frames.parts else pd.DataFrame()
+
+# Configured category columns are only converted when at most this share of their values is distinct
+CATEGORY_MAX_RATIO = 0.5
+
+def as_categories(df, columns):
+    """Store the listed columns of `df` as categoricals, skipping absent ones and those that are not
+    repetitive enough (a misconfigured ID or free-text column would only get bigger)."""
+    if df is None or not columns or df.empty:
+        return df
+    converted = {}
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            if df[col].nunique() <= len(df) * CATEGORY_MAX_RATIO:
+                converted[col] = df[col].astype("category")
+    return df.assign(**converted) if converted else df
+
+def concat_frames(frames):
+    """pd.concat(frames, ignore_index=True) that keeps categorical columns categorical.
+
+    pd.concat falls back to object when the frames' categories differ, as chunk results do;
+    here each categorical column is first recoded to the union of its categories.
+    """
+    frames = list(frames)
+    categorical = []
+    for df in frames:
+        categorical += [col for col, dtype in df.dtypes.items()
+                        if isinstance(dtype, pd.CategoricalDtype) and col not in categorical]
+    for col in categorical:
+        parts = [pd.Categorical(df[col]).categories for df in frames if col in df.columns]
+        dtype = pd.CategoricalDtype(parts[0].append(parts[1:]).unique())
+        frames = [df.assign(**{col: df[col].astype(dtype)}) if col in df.columns else df for df in frames]
+    return pd.concat(frames, ignore_index=True)
+
+def _concat_column(parts):
+    categorical = [part.cat.categories for part in parts if isinstance(part.dtype, pd.CategoricalDtype)]
+    if categorical:
+        dtype = pd.CategoricalDtype(categorical[0].append(categorical[1:]).unique())
+        parts = [part.astype(dtype) for part in parts]
+    return pd.concat(parts, ignore_index=True)
+
+
+class FrameBuilder:
+    """concat_frames for batches that arrive one at a time.
+
+    add() keeps a copy of each column, so the batch itself can be freed right away, and frame() joins
+    one column at a time while releasing its parts: the peak is the result plus one column, where
+    pd.concat over a list holds every batch and the whole result at once.
+    """
+
+    def __init__(self):
+        self.parts = {}
+        self.rows = 0
+
+    def add(self, df):
+        for col in df.columns:
+            if col not in self.parts:
+                # A column first seen in a later batch is missing in the earlier rows, as with pd.concat
+                self.parts[col] = [pd.Series(np.nan, index=pd.RangeIndex(self.rows))] if self.rows else []
+        for col, parts in self.parts.items():
+            parts.append(df[col].copy() if col in df.columns else pd.Series(np.nan, index=pd.RangeIndex(len(df))))
+        self.rows += len(df)
+
+    def consume(self, frames):
+        """add() every frame of the list `frames`, dropping each from the list once it is copied."""
+        for idx in range(len(frames)):
+            self.add(frames[idx])
+            frames[idx] = None
+
+    def frame(self):
+        columns = {}
+        for col in list(self.parts):
+            columns[col] = _concat_column(self.parts.pop(col))
+        self.rows = 0
+        return pd.DataFrame(columns, copy=False)
+
+# Rows per DataFrame batch when reading through a server-side cursor
+STREAM_BATCH_SIZE = 50000
+
+ID_TABLE = "bcp_debtor_ids"
+ID_TABLE_QUERY = f"SELECT id FROM {ID_TABLE}"
+
+def load_id_table(connection, ids, batch_size=10000):
+    """Bulk-load debtor IDs into an indexed temporary table that lives as long as `connection`.
+
+    Rendering a fetch_*.sql template with `id_list=ID_TABLE_QUERY` then runs it as one
+    statement that MySQL plans as a semi-join on the table's primary key.
+    """
+    connection.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {ID_TABLE}"))
+    connection.execute(text(f"CREATE TEMPORARY TABLE {ID_TABLE} (id BIGINT UNSIGNED NOT NULL PRIMARY KEY)"))
+    insert = text(f"INSERT IGNORE INTO {ID_TABLE} (id) VALUES (:id)")
+    for chunk in chunk_list(ids, batch_size):
+        # PyMySQL folds executemany into multi-row INSERT statements
+        connection.execute(insert, [{"id": int(id)} for id in chunk])
+    connection.commit()
+
+def release_id_source(id_source):
+    """Drop the temporary ID table (if any) and hand the id_source connection back to the pool."""
+    if id_source is None:
+        return
+    connection, _ = id_source
+    try:
+        connection.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {ID_TABLE}"))
+    finally:
+        connection.close()
+
+def _timed_fetch(query, connection, chunksize=None, cache=None, labels=None, dtype_backend=None, categories=None):
+    start_time = time()
+    df = cache.get(query) if cache is not None else None
+    if df is None:
+        # Worker threads do not inherit the caller's query labels, so they are passed along
+        with query_labels(**(labels or {})):
+            df = fetch_frame(query, connection, chunksize, dtype_backend, categories)
+        if cache is not None and df is not None:
+            cache.put(query, df)
+    else:
+        df = as_categories(df, categories)
+    return df, time() - start_time
+
+def fetch_chunks(queries, connection, max_workers=1, on_chunk=None, chunksize=None, cache=None, dtype_backend=None,
+                 categories=None):
+    """Run chunk queries with at most `max_workers` in flight and return the frames in query order.
+
+    `on_chunk(idx, total, df, duration)` is called from the calling thread as each chunk finishes,
+    so Streamlit placeholders can be updated safely. `chunksize` streams each query through a
+    server-side cursor. With a `cache` (utils.cache.ResultCache) cached chunks skip the database.
+    `dtype_backend` is passed on to read_sql; the cache should have been opened with the same one.
+    `categories` names the columns each chunk stores as categoricals (join them with concat_frames).
+    """
+    total = len(queries)
+    results = [None] * total
+    labels = current_labels()
+
+    if max_workers is None or max_workers <= 1 or total <= 1:
+        for idx, query in enumerate(queries, start=1):
+            df, duration = _timed_fetch(query, connection, chunksize, cache, dict(labels, chunk=idx), dtype_backend, categories)
+            results[idx - 1] = df
+            if on_chunk:
+                on_chunk(idx, total, df, duration)
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, total)) as executor:
+        futures = {
+            executor.submit(_timed_fetch, query, connection, chunksize, cache, dict(labels, chunk=idx), dtype_backend, categories): idx
+            for idx, query in enumerate(queries, start=1)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                df, duration = future.result()
+            except Exception:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            results[idx - 1] = df
+            if on_chunk:
+                on_chunk(idx, total, df, duration)
+
+    return results
+
+class ChunkSizer:
+    """Chunk size for one query type, steered toward a latency and row budget per chunk.
+
+    Each observed chunk gives the number of IDs that would have taken `target_seconds` and returned
+    `row_budget` rows; the size moves toward the smaller of the two, by at most a factor of two per
+    step and within [min_size, max_size].
+    """
+
+    def __init__(self, size, target_seconds=20.0, row_budget=100000, min_size=500, max_size=50000):
+        self.target_seconds = target_seconds
+        self.row_budget = row_budget
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = self._bound(size)
+
+    def _bound(self, size):
+        return int(min(max(size, self.min_size), self.max_size))
+
+    def observe(self, ids, rows, seconds):
+        # Short tail chunks are dominated by per-query overhead and say little about the rate
+        if ids <= 0 or ids < self.size / 4:
+            return
+        ideal = self.max_size
+        if seconds > 0:
+            ideal = min(ideal, self.target_seconds * ids / seconds)
+        if rows > 0:
+            ideal = min(ideal, self.row_budget * ids / rows)
+        self.size = self._bound(min(max(ideal, self.size / 2), self.size * 2))
+
+def _measured_fetch(query, connection, chunksize=None, cache=None, labels=None, dtype_backend=None, categories=None):
+    _query_timing.seconds = None
+    df, duration = _timed_fetch(query, connection, chunksize, cache, labels, dtype_backend, categories)
+    return df, duration, _query_timing.seconds
+
+def fetch_adaptive(ids, build_query, connection, sizer, max_workers=1, on_chunk=None, chunksize=None, cache=None,
+                   dtype_backend=None, categories=None, plan=None):
+    """Fetch `ids` in chunks cut as the fetch goes: every new chunk takes `sizer.size` IDs, and the
+    sizer learns from the query latency and row count of each chunk that comes back.
+
+    Returns the frames in ID order. `on_chunk` gets an estimated total, since the chunk count is
+    only known at the end. Chunks served from `cache` are not observed. A `plan` (ChunkPlan) replays
+    the chunk sizes of an earlier fetch of the same IDs first, so its cached chunks keep their keys,
+    and records the sizes this fetch cuts.
+    """
+    workers = max(1, max_workers or 1)
+    results = {}
+    pending = {}
+    position = issued = 0
+    labels = current_labels()
+    planned = plan.sizes if plan is not None else []
+    used = []
+
+    def estimated_total():
+        return issued + -(-(len(ids) - position) // sizer.size)
+
+    def submit_next():
+        nonlocal position, issued
+        while position < len(ids) and len(pending) < workers:
+            chunk = ids[position:position + (planned[issued] if issued < len(planned) else sizer.size)]
+            position += len(chunk)
+            issued += 1
+            used.append(len(chunk))
+            if plan is not None:
+                plan.save(used)
+            query = build_query(chunk)
+            cached = cache.get(query) if cache is not None else None
+            if cached is not None:
+                cached = results[issued] = as_categories(cached, categories)
+                if on_chunk:
+                    on_chunk(issued, estimated_total(), cached, 0.0)
+                continue
+            pending[executor.submit(_measured_fetch, query, connection, chunksize, cache, dict(labels, chunk=issued),
+                                    dtype_backend, categories)] = (issued, len(chunk))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx, size = pending.pop(future)
+                try:
+                    df, duration, query_seconds = future.result()
+                except Exception:
+                    for other in pending:
+                        other.cancel()
+                    raise
+                results[idx] = df
+                sizer.observe(size, 0 if df is None else len(df), duration if query_seconds is None else query_seconds)
+                if on_chunk:
+                    on_chunk(idx, estimated_total(), df, duration)
+            submit_next()
+
+    return [results[idx] for idx in sorted(results)]
+
+def run_in_threads(func, items, max_workers):
+    """Map `func` over `items` on a thread pool and return the results in order.
+
+    Workers are attached to the caller's Streamlit script context (when there is one) so
+    st.* calls made from inside `func` still render.
+    """
+    items = list(items)
+    if not items:
+        return []
+    ctx = get_script_run_ctx(suppress_warning=True)
+
+    def call(item):
+        if ctx is not None:
+            add_script_run_ctx(current_thread(), ctx)
+        return func(item)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        return list(executor.map(call, items))
+
+def category_results(series, func):
+    """func evaluated once over the categories of a categorical `series`, plus one missing value.
+
+    Indexing the returned array with series.cat.codes broadcasts it to the rows; code -1 (missing)
+    picks the last entry.
+    """
+    values = pd.Series(list(series.cat.categories) + [np.nan], dtype=object)
+    results = func(values)
+    # Lists of strings stay Python objects rather than becoming a fixed-width unicode array
+    return results if isinstance(results, np.ndarray) else np.array(list(results), dtype=object)
+
+def recode_categories(series, func):
+    """func applied per category of a categorical `series`, which stays categorical (merged categories share a code)."""
+    codes, uniques = pd.factorize(category_results(series, func))
+    return pd.Series(pd.Categorical.from_codes(codes[series.cat.codes.to_numpy()], categories=uniques),
+                     index=series.index, name=series.name)
+
+# remove_data exclusions: remarks written by the system and status codes that are not efforts.
+# Values are literal text matched without case; the Filters sheet of config.xlsx adds to them per client.
+DISPOSITION_RULES = {
+    "remark contains": ("Updates when case reassign to another collector", "New Contact Details Added",
+                        "Broken Promise", "New Assignment - OS"),
+    "status equals": ("new", "ptp", "none"),
+    "status contains": ("ABORT", "REACTIVE", "PULLOUT", "PULL OUT", "HOLD EFFORT", "LOCKED"),
+}
+
+def _any_of(values):
+    return re.compile("|".join(map(re.escape, values)), re.IGNORECASE) if values else None
+
+
+class DispositionFilter:
+    """The remove_data rules compiled once: one pattern per column and a set of excluded status codes."""
+
+    def __init__(self, rules):
+        self.remarks = _any_of(rules["remark contains"])
+        self.statuses = _any_of(rules["status contains"])
+        self.excluded = frozenset(value.lower() for value in rules["status equals"])
+
+    def keep_remark(self, value):
+        # Like the .str accessor, non-string values pass the text checks
+        if not isinstance(value, str):
+            return True
+        return value.strip() != "" and not (self.remarks and self.remarks.search(value))
+
+    def keep_status(self, value):
+        if not isinstance(value, str):
+            return True
+        return (value.strip() != "" and value.lower() not in self.excluded
+                and not (self.statuses and self.statuses.search(value)))
+
+    def apply(self, result, status_code_col, remark_col):
+        keep = _value_mask(result[remark_col], self.keep_remark) & _value_mask(result[status_code_col], self.keep_status)
+        return result[keep]
+
+def _value_mask(series, keep):
+    # keep(value) once per distinct value (categories, or factorize uniques), broadcast by codes; missing is dropped
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    results = np.fromiter(map(keep, uniques), dtype=bool, count=len(uniques))
+    return np.append(results, False)[codes]
+
+@lru_cache(maxsize=64)
+def _disposition_filter(extra_rules):
+    rules = {rule: list(values) for rule, values in DISPOSITION_RULES.items()}
+    for rule, value in extra_rules:
+        rules[rule].append(value)
+    return DispositionFilter(rules)
+
+def disposition_filter(client=None, config_path=None):
+    """Compiled remove_data rules: the defaults plus the client's rows of the config's Filters sheet; cached per rule set."""
+    return _disposition_filter(config_filter_rules(client, config_path) if client and config_path else ())
+
+def remove_data(result, status_code_col='STATUS CODE', remark_col='REMARK', client=None, config_path=None):
+    """Drop the dispositions that are not real efforts: blank or system remarks and excluded status codes.
+
+    The rules are checked once per distinct remark and status code instead of once per row; with
+    `client` and `config_path` the client's Filters rows are added to the defaults.
+    """
+    try:
+        return disposition_filter(client, config_path).apply(result, status_code_col, remark_col)
     except Exception as e:
         print(f"Error in remove_data: {e}")
         raise
@@ -108,16 +532,209 @@ def format_phone_numbers(row):
 
     return row
 
+PHONE_COLUMNS = ["phone1", "phone2", "phone3", "phone4", "phone5"]
+ADDRESS_COLUMNS = ["address1", "address2", "address3", "address4", "address5"]
+PHONE_PLACEHOLDER = "101011"
+
+def spread_by_key(keys, frame, key_col, value_col, width):
+    """Lay out the first `width` values of each key in `frame` order as columns aligned to `keys`.
+
+    Returns an object array of shape (len(keys), width) with "" where a key has fewer values.
+    """
+    slot = frame.groupby(key_col, sort=False).cumcount()
+    kept = frame.loc[slot < width, [key_col, value_col]].assign(slot=slot[slot < width])
+    wide = kept.pivot(index=key_col, columns="slot", values=value_col).reindex(columns=range(width))
+    return wide.reindex(keys.to_numpy()).fillna("").to_numpy(dtype=object)
+
+def build_phone_columns(ch_codes, contact_df):
+    """Vectorized prioritize_phones + update_phone1 + fix_phone1 + format_phone_numbers.
+
+    Returns phone1..phone5 aligned to `ch_codes`. Numbers of equal priority keep the order
+    they were fetched in, where the set-based prioritize_phones left it arbitrary.
+    """
+    numbers = contact_df[["ch_code", "number"]].dropna(subset=["number"])
+    numbers = numbers.assign(number=numbers["number"].astype(str).str.split()).explode("number")
+    numbers = numbers[numbers["number"].notna()]
+    numbers = numbers[numbers["number"].str.isdigit().astype(bool)].drop_duplicates(["ch_code", "number"])
+
+    # PH-format numbers first; the stable sort keeps fetch order inside each group
+    is_ph = numbers["number"].str.startswith("63") | numbers["number"].str.startswith("09")
+    numbers = numbers.assign(is_ph=is_ph).sort_values("is_ph", ascending=False, kind="stable")
+
+    phones = pd.DataFrame(
+        spread_by_key(ch_codes, numbers, "ch_code", "number", len(PHONE_COLUMNS)),
+        columns=PHONE_COLUMNS,
+        index=ch_codes.index,
+    )
+
+    # Empty or short phone1 becomes the placeholder (update_phone1)
+    phone1 = phones["phone1"].str.strip()
+    short = (phone1 == "") | (phone1.str.replace(" ", "").str.isdigit() & (phone1.str.len() < 8))
+    phones.loc[short, "phone1"] = PHONE_PLACEHOLDER
+
+    # Promote the first non-empty number into a placeholder phone1 (fix_phone1)
+    pending = phones["phone1"] == PHONE_PLACEHOLDER
+    for col in PHONE_COLUMNS[1:]:
+        value = phones[col].str.strip()
+        take = pending & (value != "")
+        phones.loc[take, "phone1"] = value[take]
+        phones.loc[take, col] = ""
+        pending &= ~take
+
+    # 639XXXXXXXXX / 9XXXXXXXXX → 09XXXXXXXXX (format_phone_numbers)
+    for col in PHONE_COLUMNS:
+        value = phones[col].str.strip()
+        international = value.str.startswith("63") & (value.str.len() == 12)
+        local = ~international & value.str.isnumeric() & (value.str.len() == 10) & value.str.startswith("9")
+        phones[col] = phones[col].mask(international, "0" + value.str[2:]).mask(local, "0" + value)
+
+    return phones
+
+def top_n_per_key(frame, key_col, order_col, n, ascending=False):
+    """Keep the first `n` rows per `key_col` after one stable sort on `order_col`.
+
+    Only the kept rows are materialized; they come back in rank order (nulls last).
+    """
+    positions = (
+        frame[order_col].reset_index(drop=True)
+        .sort_values(ascending=ascending, kind="stable", na_position="last")
+        .index.to_numpy()
+    )
+    keys = frame[key_col].to_numpy()[positions]
+    rank = pd.Series(keys).groupby(keys, sort=False).cumcount().to_numpy()
+    return frame.iloc[positions[rank < n]]
+
+def _encode_values(values):
+    values = values.astype(object)
+    return [encode_basestring_ascii(value) for value in values.where(values.notna(), "").map(str)]
+
+def json_objects(df, fields, arrow=False):
+    """Serialize every row of `df` as a JSON object string, column by column.
+
+    `fields` maps output keys to column names (missing columns are skipped). The output is
+    byte-identical to json.dumps({key: "" if pd.isna(value) else str(value), ...}) per row.
+    With `arrow`, each encoded column goes into an Arrow array as soon as it is built and the
+    objects are concatenated in Arrow, returning a string[pyarrow] Series.
+    """
+    fields = [(key, col) for key, col in fields.items() if col in df.columns]
+    prefixes = [("{" if i == 0 else ", ") + encode_basestring_ascii(key) + ": " for i, (key, _) in enumerate(fields)]
+    if not prefixes:
+        return pd.Series("{}", index=df.index, dtype=pd.ArrowDtype(pa.string()) if arrow else object)
+
+    value_lists = []
+    for _, col in fields:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Encoded once per category and picked by code
+            encoded = category_results(df[col], _encode_values)[df[col].cat.codes.to_numpy()]
+        else:
+            encoded = _encode_values(df[col])
+        value_lists.append(pa.array(encoded, type=pa.string()) if arrow else encoded)
+
+    if arrow:
+        # The last argument of binary_join_element_wise is the separator
+        records = pc.binary_join_element_wise(*chain.from_iterable(zip(prefixes, value_lists)), "}", "")
+        return pd.Series(records, index=df.index, dtype=pd.ArrowDtype(pa.string()))
+    records = ["".join(chain.from_iterable(zip(prefixes, row))) + "}" for row in zip(*value_lists)]
+    return pd.Series(records, index=df.index, dtype=object)
+
+def _run_starts(flat):
+    # Positions where a new run of equal keys begins
+    return np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]]) if len(flat) else np.array([], dtype=np.int64)
+
+def join_per_key(keys, values, sep):
+    """`values` joined with `sep` per key in row order, like values.groupby(keys, sort=False).agg(sep.join).
+
+    Arrow-backed values are joined in Arrow without materializing Python strings: each key's rows
+    are joined as one list slice, after a stable sort by key unless they are already contiguous.
+    """
+    if not isinstance(values.dtype, pd.ArrowDtype):
+        return values.groupby(keys, sort=False).agg(sep.join)
+    keys, values = pa.array(keys), pa.array(values)
+    if keys.null_count:
+        valid = pc.is_valid(keys)
+        keys, values = keys.filter(valid), values.filter(valid)
+    flat = keys.to_numpy(zero_copy_only=False)
+    starts = _run_starts(flat)
+    if len(starts) != pc.count_distinct(keys).as_py():
+        order = pc.sort_indices(keys)
+        keys, values = keys.take(order), values.take(order)
+        flat = keys.to_numpy(zero_copy_only=False)
+        starts = _run_starts(flat)
+    runs = pa.ListArray.from_arrays(pa.array(np.r_[starts, len(flat)], type=pa.int32()), values)
+    return pd.Series(pc.binary_join(runs, sep), index=pd.Index(flat[starts]), dtype=pd.ArrowDtype(pa.string()))
+
+def wrap_lookup(keys, mapping, prefix, suffix):
+    """prefix + mapping[key] + suffix for every key, or prefix + suffix for keys not in `mapping`.
+
+    An Arrow-backed `mapping` is wrapped in one Arrow pass instead of a copy per concatenation.
+    """
+    if not isinstance(mapping.dtype, pd.ArrowDtype):
+        return (prefix + keys.map(mapping) + suffix).fillna(prefix + suffix)
+    key_array = pa.array(keys)
+    positions = pc.index_in(key_array, value_set=pa.array(mapping.index, type=key_array.type))
+    values = pa.array(mapping).take(positions)
+    wrapped = pc.binary_join_element_wise(prefix, values, suffix, "", null_handling="replace", null_replacement="")
+    return pd.Series(wrapped, index=keys.index, dtype=pd.ArrowDtype(pa.string()))
+
 def load_mappings(client_name, config_path):
-    """Load column mappings from the sheet corresponding to the selected client."""
+    """Load column mappings from the sheet corresponding to the selected client.
+
+    The workbook is parsed once per version (utils/config.py), so repeated calls are dict lookups.
+    """
     try:
-        df_client_mappings = pd.read_excel(config_path, sheet_name=client_name)
-        mappings = list(zip(df_client_mappings["Database Column"], df_client_mappings["Mapped Column"]))
-        return mappings
+        return config_mappings(client_name, config_path)
     except ValueError:
         print(f"No sheet found for {client_name} in {config_path}")
         return []
 
+def as_datetime(values, **kwargs):
+    """pd.to_datetime that returns datetime64 for Arrow timestamp columns too.
+
+    Arrow-backed timestamps keep the fractional seconds in strftime('%S') ("27.000000000").
+    """
+    if isinstance(values.dtype, pd.ArrowDtype) and pa.types.is_timestamp(values.dtype.pyarrow_dtype):
+        values = values.astype(values.dtype.numpy_dtype)
+    return pd.to_datetime(values, **kwargs)
+
+def arrow_strings(df):
+    """Store the object columns of `df` as string[pyarrow]; columns holding anything but strings are left alone."""
+    converted = {}
+    for col in df.columns[df.dtypes == object]:
+        try:
+            converted[col] = pd.Series(pa.array(df[col], type=pa.string(), from_pandas=True), index=df.index,
+                                       dtype=pd.ArrowDtype(pa.string()))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            continue
+    return df.assign(**converted) if converted else df
+
+def fill_blanks(df, values=None):
+    """df.replace(values, "").fillna("") that keeps categorical and Arrow-backed typed columns.
+
+    Categoricals are blanked once per category. Arrow arrays cannot hold "" in a non-string
+    column; their nulls already export as empty cells, so they are left typed, and infinities in
+    `values` become nulls in typed float columns.
+    """
+    def blank(frame):
+        return (frame if values is None else frame.replace(values, "")).fillna("")
+
+    categorical = [col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    typed = [
+        col for col, dtype in df.dtypes.items()
+        if isinstance(dtype, pd.ArrowDtype)
+        and not (pa.types.is_string(dtype.pyarrow_dtype) or pa.types.is_large_string(dtype.pyarrow_dtype))
+    ]
+    if not categorical and not typed:
+        return blank(df)
+
+    columns = dict(blank(df[[col for col in df.columns if col not in categorical and col not in typed]]).items())
+    for col in categorical:
+        columns[col] = recode_categories(df[col], blank)
+    infinities = [value for value in (values or []) if isinstance(value, float) and np.isinf(value)]
+    for col in typed:
+        if infinities and pa.types.is_floating(df[col].dtype.pyarrow_dtype):
+            columns[col] = df[col].mask(df[col].isin(infinities))
+    return df.assign(**columns)
+
 def chunk_list(lst, chunk_size):
     """Split a list into smaller chunks of given size."""
     for i in range(0, len(lst), chunk_size):
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from utils.queries import explain_statement
+
+# Per-execution query metrics for fetch_data: which SQL file ran for which env/client/chunk, how
+# long it held its query slot and what it returned. BCP_EXPLAIN=1 also stores the
+# EXPLAIN FORMAT=JSON plan, once per (env, SQL file) per process.
+METRICS_DIR = "/home/ubuntu/bcp/metrics"
+METRICS_DB = os.path.join(METRICS_DIR, "query_metrics.db")
+METRICS_ENABLED = os.getenv("BCP_QUERY_METRICS", "1") != "0"
+EXPLAIN_QUERIES = os.getenv("BCP_EXPLAIN", "0") == "1"
+# Rows deep-sized per object column when recording a result's bytes
+FRAME_BYTES_SAMPLE = 1000
+
+_labels = threading.local()
+_explained = set()
+_lock = threading.Lock()
+# One connection serves every query thread; sqlite serializes the writes anyway
+_conn = None
+_db_lock = threading.Lock()
+
+@contextmanager
+def query_labels(**labels):
+    """Tag the queries run on this thread inside the block (env, client, sql, chunk)."""
+    previous = current_labels()
+    _labels.value = {**previous, **labels}
+    try:
+        yield
+    finally:
+        _labels.value = previous
+
+def current_labels():
+    return getattr(_labels, "value", {})
+
+def _connect():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    conn = sqlite3.connect(METRICS_DB, timeout=30, check_same_thread=False)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_metrics (
+            executed_at TEXT NOT NULL,
+            env TEXT,
+            client TEXT,
+            sql TEXT,
+            chunk INTEGER,
+            rows INTEGER,
+            bytes INTEGER,
+            seconds REAL,
+            explain TEXT
+        );
+    """)
+    return conn
+
+def _connection():
+    """The process-wide metrics connection, opened (and the table created) on first use; callers hold _db_lock."""
+    global _conn
+    if _conn is None:
+        _conn = _connect()
+    return _conn
+
+def _reset():
+    global _conn
+    conn, _conn = _conn, None
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+def explain_query(query, connection):
+    """EXPLAIN FORMAT=JSON for the first run of each labelled query when BCP_EXPLAIN is set, else None."""
+    if not (METRICS_ENABLED and EXPLAIN_QUERIES):
+        return None
+    labels = current_labels()
+    key = (labels.get("env"), labels.get("sql"))
+    with _lock:
+        if key in _explained:
+            return None
+        _explained.add(key)
+    try:
+        return str(pd.read_sql(explain_statement(query), con=connection).iloc[0, 0])
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+
+def record_query(seconds, rows, nbytes, plan=None):
+    """Store one execution with the current labels; metrics are best effort and never fail the query."""
+    if not METRICS_ENABLED:
+        return
+    labels = current_labels()
+    try:
+        with _db_lock:
+            conn = _connection()
+            conn.execute(
+                "INSERT INTO query_metrics (executed_at, env, client, sql, chunk, rows, bytes, seconds, explain) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), labels.get("env"), labels.get("client"),
+                 labels.get("sql"), labels.get("chunk"), int(rows), int(nbytes), float(seconds), plan)
+            )
+            conn.commit()
+    except (sqlite3.Error, OSError) as e:
+        # Reopen on the next query rather than keep a broken connection
+        with _db_lock:
+            _reset()
+        print(f"Query metrics not recorded: {e}")
+
+def frame_bytes(df):
+    """Size of `df` as memory_usage(deep=True) reports it. Object columns of frames longer than
+    FRAME_BYTES_SAMPLE rows are deep-sized on a random sample of rows and scaled, so sizing a chunk
+    does not walk all of its Python strings; the other dtypes are sized exactly."""
+    if not METRICS_ENABLED:
+        return 0
+    if len(df) <= FRAME_BYTES_SAMPLE:
+        return int(df.memory_usage(deep=True).sum())
+    total = int(df.memory_usage().sum())
+    objects = df.select_dtypes(include="object")
+    if not objects.columns.empty:
+        sample = objects.sample(FRAME_BYTES_SAMPLE, random_state=0)
+        per_row = (sample.memory_usage(deep=True, index=False).sum() - sample.memory_usage(index=False).sum()) / len(sample)
+        total += int(per_row * len(df))
+    return total
+
+def query_report(days=7, env=None):
+    """p50/p95 latency per (env, sql, client) over the last `days` days."""
+    since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    with _db_lock:
+        df = pd.read_sql("SELECT env, client, sql, rows, bytes, seconds FROM query_metrics WHERE executed_at >= ?",
+                         _connection(), params=(since,))
+    if env:
+        df = df[df["env"] == env]
+    if df.empty:
+        return df
+
+    df = df.fillna({"env": "", "client": "", "sql": "(unlabelled)"})
+    report = df.groupby(["env", "sql", "client"]).agg(
+        runs=("seconds", "size"),
+        p50=("seconds", lambda s: s.quantile(0.5)),
+        p95=("seconds", lambda s: s.quantile(0.95)),
+        max=("seconds", "max"),
+        avg_rows=("rows", "mean"),
+        avg_mb=("bytes", lambda s: s.mean() / 1024 / 1024),
+    ).reset_index()
+    return report.sort_values("p95", ascending=False).round(3)
@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+from string import Formatter
+from functools import lru_cache
+from sqlalchemy import text, bindparam, Integer, String
+
+# Registry of the query/*.sql templates. The files keep their str.format fields (app.py still
+# formats them directly); here they are validated once and turned into text() constructs whose
+# values travel as bound parameters. IN lists use expanding binds, or the id_query of a
+# single-pass fetch (temp table / active-debtor subquery) in place of {id_list}.
+QUERY_DIR = "/home/ubuntu/bcp/query"
+
+# Template field -> bind parameter; {select_clause} is an identifier list and stays structural
+BOUND_FIELDS = {"selected_client_id": "client_ids", "id_list": "ids", "since": "since"}
+STRUCTURAL_FIELDS = {"select_clause"}
+EXPANDING = {"client_ids", "ids"}
+# Typed binds, so the statements can also be rendered with literal values (EXPLAIN)
+BIND_TYPES = {"client_ids": Integer, "ids": Integer, "since": String}
+
+_BIND = re.compile(r"(?<![:\w]):(\w+)")
+
+def _plain(value):
+    """Python scalars for the DBAPI: numpy integers from DataFrame columns cannot be escaped by PyMySQL."""
+    if isinstance(value, (list, tuple, set)):
+        return [_plain(item) for item in value]
+    return value.item() if hasattr(value, "item") else value
+
+class SQLTemplate:
+    """One validated query file.
+
+    Rendered statements are kept in `statements` (the registry's, when loaded through one) under
+    the file's name and `version`, its mtime, so an edited file never serves a stale statement.
+    """
+
+    def __init__(self, name, source, version=None, statements=None):
+        fields = {field for _, field, _, _ in Formatter().parse(source) if field is not None}
+        unknown = fields - set(BOUND_FIELDS) - STRUCTURAL_FIELDS
+        if unknown:
+            raise ValueError(f"{name}.sql: unknown template field(s) {', '.join(sorted(unknown))}")
+        if source.count("{since}") != source.count("'{since}'"):
+            raise ValueError(f"{name}.sql: {{since}} must appear as a quoted literal")
+        for field in ("selected_client_id", "id_list"):
+            if source.count(f"{{{field}}}") != source.count(f"({{{field}}})"):
+                raise ValueError(f"{name}.sql: {{{field}}} must appear as IN ({{{field}}})")
+        # A single statement; the trailing semicolon would break use as a subquery
+        sql = source.strip().rstrip(";").strip()
+        if not sql or ";" in re.sub(r"'[^']*'", "''", sql):
+            raise ValueError(f"{name}.sql: expected exactly one statement")
+
+        self.name = name
+        self.source = source
+        self.version = version
+        self.statements = statements if statements is not None else {}
+        self.fields = fields
+        # Expanding binds render their own parentheses; an id_query gets them back in _statement()
+        self.sql = sql.replace("'{since}'", "{since}").replace("({selected_client_id})", "{selected_client_id}").replace("({id_list})", "{id_list}")
+
+    def _statement(self, select_clause, id_query):
+        key = (self.name, self.version, select_clause, id_query)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = self._build_statement(select_clause, id_query)
+        return statement
+
+    def _build_statement(self, select_clause, id_query):
+        values = {field: f":{bind}" for field, bind in BOUND_FIELDS.items()}
+        values["select_clause"] = select_clause
+        if id_query is not None:
+            values["id_list"] = f"({id_query})"
+        rendered = self.sql.format(**values)
+        binds = set(_BIND.findall(rendered)) & set(BOUND_FIELDS.values())
+        return text(rendered).bindparams(*(bindparam(name, expanding=name in EXPANDING, type_=BIND_TYPES[name]) for name in sorted(binds))), binds
+
+    def subquery(self):
+        """The statement text with its binds, for use in place of another template's {id_list}."""
+        return self.sql.format(**{field: f":{bind}" for field, bind in BOUND_FIELDS.items()}, select_clause=None)
+
+    def render(self, select_clause=None, id_query=None, **params):
+        """text() construct with `params` (client_ids, ids, since) bound; `id_query` replaces the IN list."""
+        if "select_clause" in self.fields and select_clause is None:
+            raise ValueError(f"{self.name}.sql needs a select_clause")
+        statement, binds = self._statement(select_clause, id_query)
+        missing = binds - set(params)
+        if missing:
+            raise ValueError(f"{self.name}.sql: missing parameter(s) {', '.join(sorted(missing))}")
+        values = {}
+        for name in binds:
+            value = params[name]
+            if name in EXPANDING and not isinstance(value, (list, tuple, set)):
+                value = [value]
+            values[name] = _plain(value)
+        return statement.bindparams(**values)
+
+
+class QueryRegistry:
+    """All query/*.sql files, reloaded when any of them changes."""
+
+    def __init__(self, directory=QUERY_DIR):
+        self.directory = directory
+        self.signature = None
+        self.templates = {}
+        # (name, mtime, select_clause, id_query) -> rendered statement, shared by the templates
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(self.directory) if entry.name.endswith(".sql")
+        ))
+
+    def load(self):
+        """Validate every template; raises ValueError naming the first bad file."""
+        signature = self._signature()
+        with self._lock:
+            if signature != self.signature:
+                templates = {}
+                for filename, mtime, _ in signature:
+                    with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as file:
+                        templates[filename[:-4]] = SQLTemplate(filename[:-4], file.read(), mtime, self.statements)
+                self.templates, self.signature = templates, signature
+                # Statements of the replaced file versions are never asked for again
+                current = {(name, template.version) for name, template in templates.items()}
+                for key in [key for key in list(self.statements) if key[:2] not in current]:
+                    self.statements.pop(key, None)
+        return self
+
+    def __getitem__(self, name):
+        return self.load().templates[name]
+
+    def names(self):
+        return sorted(self.load().templates)
+
+    def render(self, name, **kwargs):
+        return self[name].render(**kwargs)
+
+
+_registry = QueryRegistry()
+
+def queries():
+    """The shared registry of query/*.sql, validated on first use and whenever a file changes."""
+    return _registry.load()
+
+@lru_cache(maxsize=64)
+def _select_clause(mappings):
+    return ",\n".join([f"{db_col} AS '{mapped_col}'" for db_col, mapped_col in mappings])
+
+def select_clause(mappings):
+    """SELECT list for the mapped info columns, rendered once per mapping version."""
+    return _select_clause(tuple(mappings))
+
+def query_key(query):
+    """Stable text identifying a query and its bound values, for cache keys."""
+    if isinstance(query, str):
+        return query
+    return f"{query.text}\0{sorted(query.compile().params.items())!r}"
+
+def explain_statement(query):
+    """EXPLAIN FORMAT=JSON for `query`, with the same bound values."""
+    if isinstance(query, str):
+        return text(f"EXPLAIN FORMAT=JSON {query}")
+    values = query.compile().params
+    return text(f"EXPLAIN FORMAT=JSON {query.text}").bindparams(*(
+        bindparam(name, value=value, expanding=name in EXPANDING, type_=BIND_TYPES.get(name))
+        for name, value in values.items()
+    ))
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import pandas as pd
+from datetime import datetime
+
+# Incremental extraction state: one watermark row per (env, client) in SQLite and the last full
+# output of that client as a Parquet snapshot carrying a content hash per row. The same database
+# keeps the chunk sizes learned per (env, query) by the adaptive chunker.
+STATE_DIR = "/home/ubuntu/bcp/state"
+STATE_DB = os.path.join(STATE_DIR, "bcp_state.db")
+HASH_COLUMN = "_row_hash"
+
+def _connect():
+    os.makedirs(STATE_DIR, exist_ok=True)
+    conn = sqlite3.connect(STATE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS watermarks (
+            env TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            watermark TEXT NOT NULL,
+            rows INTEGER,
+            updated_at TEXT,
+            PRIMARY KEY (env, client_id)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_sizes (
+            env TEXT NOT NULL,
+            query TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            updated_at TEXT,
+            PRIMARY KEY (env, query)
+        );
+    """)
+    return conn
+
+def snapshot_path(env, client_id):
+    return os.path.join(STATE_DIR, env.lower(), f"{client_id}.parquet")
+
+def load_state(env, client_id):
+    """Return (watermark, snapshot) for the client, or (None, None) before its first full run."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT watermark FROM watermarks WHERE env = ? AND client_id = ?", (env, str(client_id))
+        ).fetchone()
+    finally:
+        conn.close()
+
+    path = snapshot_path(env, client_id)
+    if row is None or not os.path.exists(path):
+        return None, None
+    return row[0], pd.read_parquet(path)
+
+def save_state(env, client_id, watermark, snapshot):
+    """Persist the snapshot, then advance the watermark, so a crash in between only repeats work."""
+    path = snapshot_path(env, client_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    snapshot.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO watermarks (env, client_id, watermark, rows, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (env, str(client_id), watermark, len(snapshot), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def with_row_hashes(df):
+    """Return `df` with HASH_COLUMN holding a 64-bit hash of each row's values.
+
+    Object columns are cast to str first: Parquet cannot store the mixed values the leads
+    frames carry after fillna(""), and the hashes must match what comes back from disk.
+    """
+    object_columns = df.select_dtypes(include="object").columns
+    df = df.astype({col: str for col in object_columns})
+    return df.assign(**{HASH_COLUMN: pd.util.hash_pandas_object(df, index=False).to_numpy()})
+
+def merge_delta(snapshot, delta, active_ids, key="ch_code"):
+    """Fold a delta extract into the previous snapshot.
+
+    Returns (merged, changed): `merged` is the new full frame (debtors no longer active dropped,
+    re-extracted debtors replaced) and `changed` the delta rows whose content differs from the
+    snapshot. Both keep HASH_COLUMN.
+    """
+    delta = with_row_hashes(delta)
+    # Exact (key, hash) matching; mapping hashes through a float index would lose precision
+    seen = pd.MultiIndex.from_arrays([snapshot[key], snapshot[HASH_COLUMN]])
+    unchanged = pd.MultiIndex.from_arrays([delta[key], delta[HASH_COLUMN]]).isin(seen)
+
+    active = set(map(str, active_ids))
+    snapshot_keys = snapshot[key].astype(str)
+    kept = snapshot[snapshot_keys.isin(active) & ~snapshot_keys.isin(set(delta[key].astype(str)))]
+    merged = pd.concat([kept, delta], ignore_index=True)
+    return merged, delta[~unchanged]
+
+def load_chunk_size(env, query):
+    """Chunk size learned for `query` (the SQL file stem) in `env`, or None if none was saved yet."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT size FROM chunk_sizes WHERE env = ? AND query = ?", (env, query)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def save_chunk_size(env, query, size):
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO chunk_sizes (env, query, size, updated_at) VALUES (?, ?, ?, ?)",
+            (env, query, int(size), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        conn.commit()
+    finally:
+        conn.close()